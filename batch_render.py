@@ -0,0 +1,160 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from matplotlib.figure import Figure
+
+from graph_io import read_graph
+from graph_layout import LAYOUT_ENGINES, LayoutCache
+from graph_render import GraphRenderer
+from graph_store import GraphStore
+
+# Пакетная отрисовка DOT-файлов в PNG без GTK:
+#   python batch_render.py graphs/ -o pictures/ --edges --astar --desc
+# Тот же путь, что у окна: read_graph -> GraphStore -> раскладка -> GraphRenderer
+
+# Хэши уже отрисованных файлов, лежит в папке с картинками
+MANIFEST = '.batch_render.json'
+EXTENSIONS = ('.dot', '.gv', '.txt', '.gbin')
+
+
+def input_hash(filename:str, options:dict):
+    # Картинка зависит и от файла, и от настроек отрисовки
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True).encode())
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def render_file(filename:str, output:str, options:dict):
+    # Выполняется в рабочем процессе; возвращает (время, ошибка)
+    start = time.perf_counter()
+    try:
+        G = read_graph(filename)
+    except (OSError, UnicodeDecodeError, ValueError):
+        return time.perf_counter() - start, 'Ошибка чтения файла'
+    G.graph['graph'] = {'rankdir':'LR'}
+    store = GraphStore.from_graph(G)
+    if store.missing_weight:
+        return time.perf_counter() - start, 'Ошибка в файле'
+
+    try:
+        pos = LayoutCache(options['engine']).get(G)
+    except Exception:
+        return time.perf_counter() - start, 'Ошибка раскладки графа'
+
+    # Те же размеры и стили, что у холста в окне
+    fig = Figure(figsize=(6, 4), constrained_layout=True)
+    renderer = GraphRenderer(fig.add_subplot())
+    renderer.set_geometry(store, pos)
+    renderer.set_style()
+    renderer.set_labels(
+        show_edges=options['edges'],
+        show_astar=options['astar'],
+        show_desc=options['desc'],
+        label_pos=options['label_pos']
+    )
+    renderer.update_view()
+    fig.savefig(output)
+    return time.perf_counter() - start, None
+
+
+def output_name(name:str):
+    # Расширение входного файла остаётся в имени: a.dot и a.gbin в одной
+    # папке дают a.dot.png и a.gbin.png, а не одну картинку на двоих
+    return name + '.png'
+
+
+def find_inputs(directory:str):
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(EXTENSIONS) and os.path.isfile(os.path.join(directory, name))
+    )
+
+
+def load_manifest(filename:str):
+    try:
+        with open(filename) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Отрисовка папки графов DOT в PNG')
+    parser.add_argument('input', help='папка с файлами графов')
+    parser.add_argument('-o', '--output', help='папка для картинок, по умолчанию та же')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='число процессов')
+    parser.add_argument('--engine', choices=list(LAYOUT_ENGINES), default='graphviz')
+    parser.add_argument('--edges', action='store_true', help='веса граней')
+    parser.add_argument('--astar', action='store_true', help='веса узлов')
+    parser.add_argument('--desc', action='store_true', help='подписи узлов')
+    parser.add_argument('--label-pos', type=float, default=5, help='положение веса на грани, 1.5-8.5')
+    parser.add_argument('--force', action='store_true', help='перерисовать и неизменённые файлы')
+    args = parser.parse_args(argv)
+
+    output_dir = args.output or args.input
+    os.makedirs(output_dir, exist_ok=True)
+    options = {
+        'engine': args.engine,
+        'edges': args.edges,
+        'astar': args.astar,
+        'desc': args.desc,
+        'label_pos': args.label_pos / 10,
+    }
+
+    manifest_name = os.path.join(output_dir, MANIFEST)
+    manifest = {} if args.force else load_manifest(manifest_name)
+    jobs = {}
+    skipped = 0
+    for filename in find_inputs(args.input):
+        name = os.path.basename(filename)
+        output = os.path.join(output_dir, output_name(name))
+        digest = input_hash(filename, options)
+        if manifest.get(name) == digest and os.path.exists(output):
+            skipped += 1
+            continue
+        jobs[name] = (filename, output, digest)
+
+    failed = 0
+    total = time.perf_counter()
+    try:
+        if jobs:
+            with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(jobs)))) as pool:
+                futures = {
+                    pool.submit(render_file, filename, output, options): name
+                    for name, (filename, output, _) in jobs.items()
+                }
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        seconds, error = future.result()
+                    except Exception as exc:
+                        # Необработанная ошибка в процессе - только этот файл
+                        seconds, error = 0.0, f'Ошибка отрисовки: {exc!r}'
+                    if error is None:
+                        manifest[name] = jobs[name][2]
+                        print(f'{name}: {seconds:.2f} с')
+                    else:
+                        failed += 1
+                        manifest.pop(name, None)
+                        print(f'{name}: {error} ({seconds:.2f} с)', file=sys.stderr)
+    finally:
+        # Уже отрисованные файлы не перерисовываются и после прерванного запуска
+        with open(manifest_name, 'w') as file:
+            json.dump(manifest, file, indent=1, sort_keys=True)
+
+    print(
+        f'Готово: {len(jobs) - failed} отрисовано, {skipped} без изменений, '
+        f'{failed} с ошибками за {time.perf_counter() - total:.2f} с'
+    )
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
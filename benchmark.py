@@ -0,0 +1,336 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use('Agg')
+import networkx as nx
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from graph_analytics import Analytics, CSRGraph, store_snapshot
+from graph_colors import unpack_rgba
+from graph_edit import apply_edit, node_edit
+from graph_index import SpatialIndex
+from graph_io import read_graph, write_dot, write_graph_bin
+from graph_layout import force_layout, graphviz_layout
+from graph_render import GraphRenderer
+from graph_store import GraphStore
+
+# Замеры горячих путей редактора без окна:
+#   python benchmark.py                       - все размеры, результат в bench_results.json
+#   python benchmark.py --sizes 10,1000 --save-baseline
+#   python benchmark.py --baseline bench_baseline.json
+# Регрессии ищутся только с --baseline: общей базы в репозитории нет,
+# времена зависят от машины, так что базу пишут у себя через --save-baseline
+# Пути окна вызываются через те же модули, что использует MainWindow:
+# redraw - GraphRenderer на Agg, pan_zoom - сдвиг по снимкам слоёв,
+# choose_node - SpatialIndex, update_node - node_edit/apply_edit/GraphStore.apply_edit,
+# load_dot/save_dot - graph_io, analytics - снимок хранилища и все метрики
+
+SIZES = (10, 100, 1000, 10000, 100000)
+# Средняя степень узла
+DENSITIES = (2, 6)
+# plain - только веса граней, full - ещё цвета, веса A* и подписи
+MIXES = ('plain', 'full')
+
+# Регрессия: медленнее базы больше чем на THRESHOLD и на NOISE секунд
+THRESHOLD = 0.25
+NOISE = 0.005
+
+
+def synthetic_graph(n:int, degree:int, mix:str, seed:int=0):
+    rng = np.random.default_rng(seed)
+    names = [f'n{i}' for i in range(n)]
+    G = nx.Graph()
+    G.add_nodes_from(names)
+    m = n * degree // 2
+    u = rng.integers(0, n, m)
+    v = rng.integers(0, n, m)
+    weights = rng.integers(1, 20, m)
+    colors = rng.integers(0, 1 << 24, m) << 8 | 255
+    for a, b, w, c in zip(u.tolist(), v.tolist(), weights.tolist(), colors.tolist()):
+        if a != b:
+            G.add_edge(names[a], names[b], weight=str(w))
+            if mix == 'full':
+                G.edges[names[a], names[b]]['fillcolor'] = c
+    if mix == 'full':
+        for i, name in enumerate(names):
+            G.nodes[name].update(
+                weight=str(i % 10),
+                fillcolor=int(colors[i % m]) if m else 0x9a9996ff,
+                description=f'узел {i}' if i % 3 == 0 else ''
+            )
+    G.graph['graph'] = {'rankdir':'LR'}
+    return G
+
+
+def dot_text(G):
+    # Файл для load_dot пишется напрямую: pydot на 100k узлов сам по себе бенчмарк
+    def attrs(data):
+        return ' '.join(
+            f'{key}="{unpack_rgba(value) if key == "fillcolor" else value}"' for key, value in data.items()
+        )
+
+    lines = ['graph {']
+    for node, data in G.nodes(data=True):
+        lines.append(f'"{node}" [{attrs(data)}];' if data else f'"{node}";')
+    for u, v, data in G.edges(data=True):
+        lines.append(f'"{u}" -- "{v}" [{attrs(data)}];')
+    lines.append('}')
+    return '\n'.join(lines)
+
+
+class Case:
+    # setup(state) готовит данные вне замера, run(data) - замеряемая часть
+    def __init__(self, name, setup, run, max_nodes=None, available=True):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.max_nodes = max_nodes
+        self.available = available
+
+
+def _pos(state):
+    if 'pos' not in state:
+        state['pos'] = force_layout(state['G'])
+    return state['pos']
+
+
+def _redraw(data):
+    G, pos = data
+    # Без холста Agg у Figure пустой canvas.draw(), и ничего не рисуется
+    fig = Figure(figsize=(6, 4), constrained_layout=True)
+    FigureCanvasAgg(fig)
+    renderer = GraphRenderer(fig.add_subplot())
+    store = GraphStore.from_graph(G)
+    renderer.set_geometry(store, pos)
+    renderer.set_style(1)
+    renderer.set_labels(show_edges=True, show_astar=True, show_desc=True)
+    renderer.update_view()
+    fig.canvas.draw()
+
+
+def _pan_setup(state):
+    G, pos = state['G'], _pos(state)
+    fig = Figure(figsize=(6, 4), constrained_layout=True)
+    FigureCanvasAgg(fig)
+    renderer = GraphRenderer(fig.add_subplot(), cached=True)
+    renderer.set_geometry(GraphStore.from_graph(G), pos)
+    renderer.set_style(1)
+    renderer.set_labels(show_edges=True, show_astar=True, show_desc=True)
+    renderer.update_view()
+    fig.canvas.draw()
+    return fig, renderer
+
+
+def _pan_zoom(data):
+    # Как колесо и перетаскивание в окне: 10 шагов navigate без пересчёта
+    fig, renderer = data
+    ax = renderer.ax
+    for i in range(10):
+        (x0, x1), (y0, y1) = ax.get_xlim(), ax.get_ylim()
+        shift = (x1 - x0) * 0.05
+        ax.set_xlim(x0 * 0.9 + shift, x1 * 0.9 + shift)
+        ax.set_ylim(y0 * 0.9, y1 * 0.9)
+        # На Agg draw_idle рисует сразу
+        renderer.navigate()
+
+
+def _choose_node(data):
+    # Индекс строится заново, как после новой раскладки, и 1000 щелчков
+    pos, transform, clicks = data
+    index = SpatialIndex(pos)
+    for x, y in clicks:
+        index.nearest(transform, x, y, 15)
+
+
+def _choose_setup(state):
+    pos = _pos(state)
+    xy = np.array(list(pos.values()))
+    ax = Figure(figsize=(6, 4)).add_subplot()
+    ax.set_xlim(xy[:, 0].min(), xy[:, 0].max())
+    ax.set_ylim(xy[:, 1].min(), xy[:, 1].max())
+    rng = np.random.default_rng(1)
+    return pos, ax.transData, ax.transData.transform(xy[rng.integers(0, len(xy), 1000)])
+
+
+def _update_setup(state):
+    G = state['G'].copy()
+    rng = np.random.default_rng(2)
+    nodes = list(G)
+    picks = [nodes[i] for i in rng.integers(0, len(nodes), 100)]
+    return G, GraphStore.from_graph(G), picks, nodes
+
+
+def _update_node(data):
+    # Как update_node: новый цвет узла и одна заменённая грань
+    G, store, picks, nodes = data
+    for i, node in enumerate(picks):
+        edges = {v: dict(d) for _, v, d in G.edges(node, data=True)}
+        if edges:
+            edges.pop(next(iter(edges)))
+        edges[nodes[(i * 7919) % len(nodes)]] = {'weight': i, 'fillcolor': 255}
+        edit = node_edit(G, node, {'fillcolor': i << 8 | 255}, edges)
+        if edit is None:
+            continue
+        # Те же вызовы, что в MainWindow.commit_edit
+        apply_edit(G, edit)
+        store.apply_edit(G, edit)
+
+
+def _analytics(store):
+    # Как рабочий поток аналитики окна: снимок, CSR и все метрики
+    Analytics(CSRGraph(*store_snapshot(store)), 0).compute()
+
+
+CASES = [
+    Case('load_dot', lambda state: state['dot'], read_graph),
+    Case('load_bin', lambda state: state['bin'], read_graph),
+    Case('save_dot', lambda state: (state['G'], state['out']), lambda data: write_dot(*data), max_nodes=20000),
+    Case('save_bin', lambda state: (state['G'], state['out']), lambda data: write_graph_bin(*data)),
+    Case('force_layout', lambda state: state['G'], force_layout),
+    Case(
+        'pydot_layout', lambda state: state['G'], graphviz_layout,
+        max_nodes=10000, available=shutil.which('dot') is not None
+    ),
+    Case('redraw', lambda state: (state['G'], _pos(state)), _redraw),
+    Case('pan_zoom', _pan_setup, _pan_zoom),
+    Case('choose_node', _choose_setup, _choose_node),
+    Case('update_node', _update_setup, _update_node),
+    Case('analytics', lambda state: GraphStore.from_graph(state['G']), _analytics),
+]
+
+
+def measure(case, state, repeat):
+    times = []
+    for _ in range(repeat):
+        data = case.setup(state)
+        start = time.perf_counter()
+        case.run(data)
+        times.append(time.perf_counter() - start)
+
+    # Память отдельным прогоном: tracemalloc замедляет код в разы
+    data = case.setup(state)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    case.run(data)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+    return {'time_s': min(times), 'times': times, 'peak_bytes': peak, 'blocks': blocks}
+
+
+def run_suite(sizes, densities, mixes, cases, repeat, log=print):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            for degree in densities:
+                for mix in mixes:
+                    graph = f'n{n}-d{degree}-{mix}'
+                    G = synthetic_graph(n, degree, mix)
+                    state = {
+                        'G': G,
+                        'dot': os.path.join(tmp, 'graph.dot'),
+                        'bin': os.path.join(tmp, 'graph.gbin'),
+                        'out': os.path.join(tmp, 'out'),
+                    }
+                    with open(state['dot'], 'w') as file:
+                        file.write(dot_text(G))
+                    write_graph_bin(G, state['bin'])
+
+                    for case in cases:
+                        if not case.available or case.max_nodes is not None and n > case.max_nodes:
+                            continue
+                        result = measure(case, state, 1 if n >= 10000 else repeat)
+                        result.update(case=case.name, graph=graph, nodes=len(G), edges=G.number_of_edges())
+                        results.append(result)
+                        log(
+                            f'{case.name:>13} {graph:>20}: {result["time_s"] * 1000:10.1f} мс '
+                            f'{result["peak_bytes"] / 2**20:8.1f} МБ {result["blocks"]:>9} блоков'
+                        )
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD, noise=NOISE):
+    # -> [(case, graph, что, было, стало)] для ухудшившихся замеров
+    base = {(r['case'], r['graph']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = base.get((result['case'], result['graph']))
+        if old is None:
+            continue
+        if result['time_s'] > old['time_s'] * (1 + threshold) and result['time_s'] - old['time_s'] > noise:
+            regressions.append((result['case'], result['graph'], 'time_s', old['time_s'], result['time_s']))
+        if result['peak_bytes'] > old['peak_bytes'] * (1 + threshold) and result['peak_bytes'] - old['peak_bytes'] > 1 << 20:
+            regressions.append((result['case'], result['graph'], 'peak_bytes', old['peak_bytes'], result['peak_bytes']))
+    return regressions
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'networkx': nx.__version__,
+        'matplotlib': matplotlib.__version__,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замеры горячих путей редактора графов')
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help='числа узлов через запятую')
+    parser.add_argument('--densities', default=','.join(map(str, DENSITIES)), help='средние степени через запятую')
+    parser.add_argument('--mixes', default=','.join(MIXES), help='наборы атрибутов: plain, full')
+    parser.add_argument('--cases', default=','.join(case.name for case in CASES), help='какие пути замерять')
+    parser.add_argument('--repeat', type=int, default=3, help='повторов на замер, берётся лучший')
+    parser.add_argument('-o', '--output', default='bench_results.json', help='файл результатов')
+    parser.add_argument('--baseline', help='файл базы для поиска регрессий, без него проверки нет')
+    parser.add_argument('--save-baseline', action='store_true', help='записать результаты и как базу')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='допустимое замедление, доля')
+    args = parser.parse_args(argv)
+
+    names = set(args.cases.split(','))
+    results = run_suite(
+        [int(n) for n in args.sizes.split(',')],
+        [int(d) for d in args.densities.split(',')],
+        args.mixes.split(','),
+        [case for case in CASES if case.name in names],
+        args.repeat
+    )
+    report = {'environment': environment(), 'results': results}
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=1)
+
+    baseline_name = args.baseline or 'bench_baseline.json'
+    if args.save_baseline:
+        with open(baseline_name, 'w') as file:
+            json.dump(report, file, indent=1)
+        print(f'База записана в {baseline_name}')
+        return 0
+
+    if args.baseline:
+        with open(baseline_name) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        for case, graph, metric, old, new in regressions:
+            print(f'РЕГРЕССИЯ {case} {graph} {metric}: {old:.4g} -> {new:.4g} ({new / old:.2f}x)')
+        if regressions:
+            return 1
+        print('Регрессий нет')
+    else:
+        print('Без --baseline регрессии не проверяются')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import time
+
+import numpy as np
+
+from graph_colors import pack_rgba
+from graph_profile import span
+
+# Аналитика по всему графу на массивах numpy: смежность один раз собирается
+# в разреженную матрицу CSR (indptr, indices) по столбцам GraphStore, дальше
+# степени, компоненты связности, PageRank и посредничество считаются по ней
+# в рабочем потоке. Посредничество - по путям в шагах, веса граней не
+# учитываются. На графах больше EXACT_LIMIT узлов PageRank сходится грубее,
+# а посредничество оценивается по выборке источников
+
+EXACT_LIMIT = 1000
+# Источников в выборке: не больше SAMPLES и не больше, чем помещается
+# в SAMPLE_BUDGET просмотров граней, но не меньше MIN_SAMPLES
+SAMPLES = 200
+MIN_SAMPLES = 16
+SAMPLE_BUDGET = 10_000_000
+PAGERANK_ALPHA = 0.85
+# Допуск PageRank на узел: точный и для больших графов
+PAGERANK_TOL = 1e-8
+PAGERANK_TOL_APPROX = 1e-5
+PAGERANK_ITERATIONS = 100
+
+# Непрерывная шкала (viridis) и цвета компонент, крупнейшая компонента первой
+GRADIENT = ['#440154', '#3b528b', '#21918c', '#5ec962', '#fde725']
+PALETTE = [
+    '#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+    '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf',
+]
+
+
+def store_snapshot(store):
+    # Снимок хранилища для рабочего потока: имена узлов и концы граней
+    # номерами 0..n-1. Индексация массивов копирует, дальше поток
+    # с хранилищем не связан
+    rows = store.node_rows()
+    at = np.full(store.n_rows, -1, dtype=np.intp)
+    at[rows] = np.arange(len(rows))
+    edges = store.edge_rows()
+    return store.node_name[rows], at[store.edge_src[edges]], at[store.edge_dst[edges]], store.directed
+
+
+class CSRGraph:
+    # Смежность в формате CSR: соседи узла i - indices[indptr[i]:indptr[i + 1]].
+    # У неориентированного графа каждая грань записана в обе стороны, петля - один раз.
+    # src и dst - исходный список граней, по нему считаются степени и компоненты
+
+    def __init__(self, names, src, dst, directed=False):
+        self.names = names
+        self.n = len(names)
+        self.src = src
+        self.dst = dst
+        self.directed = directed
+        if not directed:
+            loops = src == dst
+            src, dst = np.concatenate((src, dst[~loops])), np.concatenate((dst, src[~loops]))
+        order = np.argsort(src, kind='stable')
+        self.indices = dst[order]
+        self.indptr = np.zeros(self.n + 1, dtype=np.intp)
+        np.cumsum(np.bincount(src, minlength=self.n), out=self.indptr[1:])
+
+    def out_degree(self):
+        return np.diff(self.indptr)
+
+    def expand(self, frontier):
+        # Все грани из узлов frontier: (начала, концы) одним проходом без цикла по узлам
+        starts = self.indptr[frontier]
+        counts = self.indptr[frontier + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return np.repeat(frontier, counts), self.indices[offsets]
+
+
+def degree_distribution(csr:CSRGraph):
+    # Степень как в networkx: у орграфа входящие плюс исходящие, петля считается дважды.
+    # -> (степени узлов, число узлов каждой степени)
+    degrees = np.bincount(csr.src, minlength=csr.n) + np.bincount(csr.dst, minlength=csr.n)
+    return degrees, np.bincount(degrees)
+
+
+def degree_bins(histogram):
+    # Гистограмма степеней по степеням двойки: [(от, до, узлов)], пустые корзины пропускаются
+    bins = []
+    low = 0
+    while low < len(histogram):
+        high = max(low, 2 * low - 1)
+        count = int(histogram[low:high + 1].sum())
+        if count:
+            bins.append((low, min(high, len(histogram) - 1), count))
+        low = high + 1
+    return bins
+
+
+def connected_components(csr:CSRGraph):
+    # У орграфа - слабые компоненты. Каждая грань подвешивает больший из корней
+    # своих концов к меньшему, затем метки сжимаются перескоком по указателям:
+    # проходов порядка логарифма числа узлов, а не диаметра графа.
+    # -> (номер компоненты узла, размеры компонент), крупнейшая - номер 0
+    labels = np.arange(csr.n)
+    while True:
+        lu, lv = labels[csr.src], labels[csr.dst]
+        differ = lu != lv
+        if not differ.any():
+            break
+        lu, lv = lu[differ], lv[differ]
+        np.minimum.at(labels, np.maximum(lu, lv), np.minimum(lu, lv))
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    _, labels, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    order = np.argsort(-sizes, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[labels], sizes[order]
+
+
+def pagerank(csr:CSRGraph, alpha=PAGERANK_ALPHA, tol=PAGERANK_TOL, iterations=PAGERANK_ITERATIONS):
+    # Степенной метод, как nx.pagerank без весов: доля висячих узлов
+    # раздаётся всем поровну. Останавливается, когда изменение меньше n * tol
+    n = csr.n
+    if n == 0:
+        return np.zeros(0)
+    degree = csr.out_degree()
+    rows = np.repeat(np.arange(n), degree)
+    dangling = degree == 0
+    share = np.zeros(n)
+    rank = np.full(n, 1 / n)
+    for _ in range(iterations):
+        np.divide(rank, degree, out=share, where=~dangling)
+        new = alpha * np.bincount(csr.indices, share[rows], minlength=n)
+        new += (alpha * rank[dangling].sum() + 1 - alpha) / n
+        error = np.abs(new - rank).sum()
+        rank = new
+        if error < n * tol:
+            break
+    return rank
+
+
+def betweenness(csr:CSRGraph, sources=None, cancelled=None):
+    # Алгоритм Брандеса, обход в ширину по уровням целиком: грани уровня
+    # обрабатываются массивом, а не по одной. sources - выборка источников,
+    # тогда сумма масштабируется на n / k. Нормировка как в
+    # nx.betweenness_centrality. -> None, если cancelled() сработал
+    n = csr.n
+    result = np.zeros(n)
+    if n < 3:
+        return result
+    if sources is None:
+        sources = range(n)
+    dist = np.empty(n, dtype=np.intp)
+    sigma = np.empty(n)
+    delta = np.empty(n)
+    for k, source in enumerate(sources):
+        if cancelled is not None and k % 16 == 0 and cancelled():
+            return None
+        dist.fill(-1)
+        sigma.fill(0)
+        delta.fill(0)
+        dist[source] = 0
+        sigma[source] = 1
+        frontier = np.array([source])
+        levels = []
+        depth = 0
+        while frontier.size:
+            u, v = csr.expand(frontier)
+            depth += 1
+            frontier = np.unique(v[dist[v] < 0])
+            dist[frontier] = depth
+            tree = dist[v] == depth
+            u, v = u[tree], v[tree]
+            np.add.at(sigma, v, sigma[u])
+            levels.append((u, v))
+        # Зависимости копятся от дальних уровней к ближним
+        for u, v in reversed(levels):
+            np.add.at(delta, u, sigma[u] / sigma[v] * (1 + delta[v]))
+        delta[source] = 0
+        result += delta
+    result /= (n - 1) * (n - 2)
+    if len(sources) < n:
+        result *= n / len(sources)
+    return result
+
+
+class Analytics:
+    # Все метрики одного снимка графа; значения - по номерам узлов csr.names
+
+    def __init__(self, csr:CSRGraph, revision:int):
+        self.csr = csr
+        self.revision = revision
+        self.approximate = csr.n > EXACT_LIMIT
+        self.samples = csr.n
+        if self.approximate:
+            budget = SAMPLE_BUDGET // max(len(csr.indices), 1)
+            self.samples = min(SAMPLES, csr.n, max(MIN_SAMPLES, budget))
+        self.metrics = {}
+        self.degree_hist = None
+        self.component_sizes = None
+        self.seconds = 0.0
+
+    def compute(self, cancelled=None):
+        # -> False, если расчёт прерван
+        started = time.perf_counter()
+        with span('analytics.degree'):
+            self.metrics['degree'], self.degree_hist = degree_distribution(self.csr)
+        with span('analytics.components'):
+            self.metrics['component'], self.component_sizes = connected_components(self.csr)
+        with span('analytics.pagerank'):
+            self.metrics['pagerank'] = pagerank(
+                self.csr, tol=PAGERANK_TOL_APPROX if self.approximate else PAGERANK_TOL
+            )
+        if cancelled is not None and cancelled():
+            return False
+        with span('analytics.betweenness'):
+            sources = None
+            if self.approximate:
+                # Выборка постоянна для ревизии: оценка не скачет между расчётами
+                sources = np.random.default_rng(self.revision).choice(self.csr.n, self.samples, replace=False)
+            values = betweenness(self.csr, sources, cancelled)
+        if values is None:
+            return False
+        self.metrics['betweenness'] = values
+        self.seconds = time.perf_counter() - started
+        return True
+
+    def top(self, metric:str, limit=5):
+        # [(узел, значение)] по убыванию
+        values = self.metrics[metric]
+        order = np.argsort(-values, kind='stable')[:limit]
+        return [(self.csr.names[i], values[i]) for i in order]
+
+    def colors(self, metric:str):
+        # {узел: упакованный цвет}. Компоненты - по палитре, остальное - по
+        # месту узла в ряду, а не по значению: у степеней и PageRank длинный
+        # хвост, и по значению почти все узлы были бы одного цвета
+        values = self.metrics[metric]
+        if metric == 'component':
+            palette = np.array([pack_rgba(color) for color in PALETTE], dtype=np.uint32)
+            packed = palette[values % len(palette)]
+        else:
+            # Равные значения - одно место, иначе одинаковые узлы получили бы разный цвет
+            position = np.searchsorted(np.sort(values), values) / max(len(values) - 1, 1)
+            stops = np.array([pack_rgba(color) for color in GRADIENT], dtype=np.uint32)
+            at = np.linspace(0, 1, len(stops))
+            packed = np.zeros(len(values), dtype=np.uint32)
+            for shift in (24, 16, 8):
+                channel = np.interp(position, at, (stops >> shift) & 255)
+                packed |= np.round(channel).astype(np.uint32) << shift
+            packed |= 255
+        return {name: int(color) for name, color in zip(self.csr.names, packed)}
@@ -0,0 +1,223 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import networkx as nx
+
+from graph_edit import Edit, apply_edit
+from graph_io import read_graph, write_dot, write_graph_bin
+from graph_profile import span
+
+# Папка автосохранения:
+#   journal.jsonl        - первая строка {"generation": g}, дальше по правке на строку
+#   snapshot-<g>.gbin    - граф на момент начала журнала
+# Правки дописываются в конец журнала; раз в COMPACT_EDITS правок или
+# COMPACT_INTERVAL секунд граф целиком пишется в новый снимок, а журнал
+# начинается заново. Новый снимок появляется раньше нового журнала, а старый
+# удаляется последним, так что при сбое на любом шаге журнал ссылается на
+# существующий снимок
+
+
+class Autosave:
+    COMPACT_EDITS = 1000
+    COMPACT_INTERVAL = 60
+    JOURNAL = 'journal.jsonl'
+
+    def __init__(self, directory:str, G, on_recovered=None, on_error=None):
+        # Вся работа с диском - в своём потоке. Поток держит собственную копию
+        # графа G и применяет к ней те же правки, что и окно; снимок пишется
+        # с неё, не трогая граф окна. on_recovered(G или None, если
+        # восстанавливать нечего) и on_error(ошибка)
+        # вызываются из этого потока
+        self.directory = directory
+        self.on_recovered = on_recovered
+        self.on_error = on_error
+        self.G = None
+        self.generation = 0
+        self.journal = None
+        self.edits = 0
+        self.snapshot_time = time.monotonic()
+        self.closed = False
+        self.ops = queue.Queue()
+        self.ops.put(('recover', G))
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def record(self, edit:Edit):
+        # Правка уже применена к графу окна; объект Edit после этого не меняется
+        self.ops.put(('edit', edit))
+
+    def reset(self, G, snapshot=False):
+        # Граф заменён целиком (открыт файл, создан новый); G - копия для потока.
+        # snapshot=True - снимок пишется сразу, а не с первой правкой: так
+        # восстановленный граф, которого нет ни в одном файле, не теряется
+        self.ops.put(('reset', (G, snapshot)))
+
+    def close(self, keep=False, on_closed=None):
+        # Окно закрыто штатно: восстанавливать нечего, файлы удаляются.
+        # keep=True - журнал остаётся, как после сбоя. Не ждёт поток:
+        # on_closed() вызывается из него, когда файлы удалены или дописаны
+        # Журнал, который останется, дописывается всеми правками из очереди
+        self.closed = not keep
+        self.ops.put(('close', (keep, on_closed)))
+
+    def run(self):
+        while True:
+            try:
+                op, value = self.ops.get(timeout=self.COMPACT_INTERVAL)
+            except queue.Empty:
+                op, value = 'idle', None
+            try:
+                if op == 'close':
+                    keep, on_closed = value
+                    try:
+                        if keep:
+                            self._sync()
+                            self._close_journal()
+                        else:
+                            self._remove_files()
+                    finally:
+                        if on_closed is not None:
+                            on_closed()
+                    return
+                if self.closed:
+                    continue
+                if op == 'recover':
+                    self._recover(value)
+                elif op == 'reset':
+                    G, snapshot = value
+                    self._close_journal()
+                    self._remove_files()
+                    self.G = G
+                    self.edits = 0
+                    if snapshot:
+                        self._compact()
+                elif op == 'edit':
+                    self._append(value)
+                # Запись на диск - когда очередь разобрана, одной пачкой
+                if self.ops.empty():
+                    self._sync()
+            except (OSError, ValueError) as error:
+                if self.on_error is not None:
+                    self.on_error(error)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _snapshot_name(self, generation):
+        return f'snapshot-{generation}.gbin'
+
+    def _recover(self, G):
+        # Журнал и снимок от прошлого запуска, который не закрылся штатно
+        with span('autosave.recover'):
+            recovered = self._read()
+        if recovered is None:
+            self.G = G
+            if self.on_recovered is not None:
+                self.on_recovered(None)
+            return
+        self.G = recovered
+        # Окно получает граф и при ошибке записи снимка ниже
+        if self.on_recovered is not None:
+            self.on_recovered(recovered.copy())
+        # Журнал мог оборваться посреди строки, дальше писать в него нельзя
+        self._compact()
+
+    def _read(self):
+        try:
+            with open(self._path(self.JOURNAL)) as file:
+                header = json.loads(file.readline())
+                self.generation = header['generation']
+                G = read_graph(self._path(self._snapshot_name(self.generation)))
+                for line in file:
+                    try:
+                        nodes, edges = json.loads(line)
+                    except ValueError:
+                        # Недописанная последняя строка
+                        break
+                    try:
+                        apply_edit(G, Edit(
+                            {node: (None, after) for node, after in nodes},
+                            {(u, v): (None, after) for u, v, after in edges}
+                        ))
+                    except (KeyError, nx.NetworkXError):
+                        continue
+        except (OSError, ValueError, KeyError):
+            return None
+        return G
+
+    def _append(self, edit):
+        try:
+            apply_edit(self.G, edit)
+        except (KeyError, nx.NetworkXError):
+            # Правка к графу окна, сделанная до того, как восстановленный граф
+            # попал в окно; recovery_done следом пришлёт reset
+            return
+        if self.journal is None:
+            self._compact()
+            return
+        with span('autosave.append'):
+            nodes = [[node, after] for node, (_, after) in edit.nodes.items()]
+            edges = [[u, v, after] for (u, v), (_, after) in edit.edges.items()]
+            self.journal.write(json.dumps([nodes, edges], ensure_ascii=False) + '\n')
+        self.edits += 1
+
+    def _sync(self):
+        if self.journal is None:
+            return
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        if self.edits >= self.COMPACT_EDITS or \
+                self.edits and time.monotonic() - self.snapshot_time >= self.COMPACT_INTERVAL:
+            self._compact()
+
+    def _compact(self):
+        with span('autosave.snapshot'):
+            os.makedirs(self.directory, exist_ok=True)
+            generation = self.generation + 1
+            snapshot = self._path(self._snapshot_name(generation))
+            try:
+                write_graph_bin(self.G, snapshot + '.tmp')
+            except ValueError:
+                # Нечисловые веса двоичный формат не хранит, read_graph поймёт и DOT
+                write_dot(self.G, snapshot + '.tmp')
+            self._fsync(snapshot + '.tmp')
+            os.replace(snapshot + '.tmp', snapshot)
+
+            journal = self._path(self.JOURNAL)
+            with open(journal + '.tmp', 'w') as file:
+                file.write(json.dumps({'generation': generation}) + '\n')
+                file.flush()
+                os.fsync(file.fileno())
+            self._close_journal()
+            os.replace(journal + '.tmp', journal)
+            self._remove_snapshots(keep=generation)
+
+        self.generation = generation
+        self.journal = open(journal, 'a')
+        self.edits = 0
+        self.snapshot_time = time.monotonic()
+
+    def _fsync(self, filename):
+        with open(filename, 'rb') as file:
+            os.fsync(file.fileno())
+
+    def _close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def _remove_snapshots(self, keep=None):
+        for name in os.listdir(self.directory):
+            if name.startswith('snapshot-') and name != self._snapshot_name(keep):
+                os.remove(self._path(name))
+
+    def _remove_files(self):
+        self._close_journal()
+        if not os.path.isdir(self.directory):
+            return
+        if os.path.exists(self._path(self.JOURNAL)):
+            os.remove(self._path(self.JOURNAL))
+        self._remove_snapshots()
@@ -0,0 +1,59 @@
+import numpy as np
+
+# Цвета в графе хранятся упакованными в одно число 0xRRGGBBAA,
+# строки вида 'rgb(r,g,b)' появляются только на входе и выходе DOT
+
+NODE_COLOR = '#9a9996'
+NODE_RGBA = 0x9a9996ff
+EDGE_RGBA = 0x000000ff
+
+
+def pack_rgba(color):
+    # 'rgb(r,g,b)', 'rgba(r,g,b,a)', '#rrggbb[aa]' или уже упакованный цвет
+    if isinstance(color, (int, np.integer)):
+        return int(color)
+    color = color.strip().strip('"')
+    if color.startswith('#') and len(color) in (7, 9):
+        r, g, b = (int(color[i:i + 2], 16) for i in (1, 3, 5))
+        a = int(color[7:9], 16) if len(color) == 9 else 255
+    else:
+        parts = color[color.index('(') + 1:color.rindex(')')].split(',')
+        r, g, b = (int(part) for part in parts[:3])
+        a = round(float(parts[3]) * 255) if len(parts) > 3 else 255
+    return (r << 24) | (g << 16) | (b << 8) | a
+
+
+def pack_floats(red:float, green:float, blue:float, alpha:float=1.0):
+    # Как Gdk.RGBA.to_string(): компоненты округляются до байта
+    r, g, b, a = (round(min(max(c, 0.0), 1.0) * 255) for c in (red, green, blue, alpha))
+    return (r << 24) | (g << 16) | (b << 8) | a
+
+
+def _alpha_str(a:int):
+    # Самая короткая десятичная запись, дающая тот же байт прозрачности
+    for digits in range(1, 6):
+        text = f'{a / 255:.{digits}f}'.rstrip('0').rstrip('.')
+        if round(float(text) * 255) == a:
+            return text
+    return repr(a / 255)
+
+
+def unpack_rgba(packed:int):
+    r, g, b, a = (packed >> 24) & 255, (packed >> 16) & 255, (packed >> 8) & 255, packed & 255
+    if a == 255:
+        return f'rgb({r},{g},{b})'
+    return f'rgba({r},{g},{b},{_alpha_str(a)})'
+
+
+def rgba2hex(packed:int):
+    return f'#{(packed >> 8) & 0xffffff:06x}'
+
+
+def rgba_array(packed):
+    # Упакованные цвета -> массив (n, 4) для matplotlib. Прозрачность
+    # не учитывается, узлы и грани всегда рисовались непрозрачными
+    packed = np.asarray(packed, dtype=np.uint32)
+    colors = np.ones((len(packed), 4))
+    for channel, shift in enumerate((24, 16, 8)):
+        colors[:, channel] = ((packed >> shift) & 255) / 255
+    return colors
@@ -0,0 +1,185 @@
+class Edit:
+    # Разница между двумя состояниями графа: только то, что поменялось.
+    # nodes: {узел: (атрибуты до, атрибуты после)}, edges: {(u, v): (до, после)};
+    # None до - узла или грани не было, None после - их удалили
+
+    __slots__ = ('nodes', 'edges')
+
+    def __init__(self, nodes, edges):
+        self.nodes = nodes
+        self.edges = edges
+
+    def reversed(self):
+        return Edit(
+            {node: (after, before) for node, (before, after) in self.nodes.items()},
+            {edge: (after, before) for edge, (before, after) in self.edges.items()}
+        )
+
+    def structural(self):
+        # Появились или исчезли узлы и грани - нужна новая раскладка
+        return any(before is None or after is None for before, after in self.nodes.values()) or \
+            any(before is None or after is None for before, after in self.edges.values())
+
+    def touched(self):
+        nodes = set(self.nodes)
+        for u, v in self.edges:
+            nodes.update((u, v))
+        return nodes
+
+    def weighted(self):
+        # Узлы, у которых поменялся вес или вес/состав граней
+        nodes = {node for node, (before, after) in self.nodes.items() if _weight_changed(before, after)}
+        for (u, v), (before, after) in self.edges.items():
+            if _weight_changed(before, after):
+                nodes.update((u, v))
+        return nodes
+
+    def weighted_edges(self):
+        return [edge for edge, (before, after) in self.edges.items() if _weight_changed(before, after)]
+
+
+def _weight_changed(before, after):
+    if before is None or after is None:
+        return True
+    return before.get('weight') != after.get('weight')
+
+
+def _same_weight(a, b):
+    # Панель даёт веса числами, DOT - строками: '5' и 5 - один вес
+    if str(a) == str(b):
+        return True
+    try:
+        return float(str(a).strip('"')) == float(str(b).strip('"'))
+    except ValueError:
+        return False
+
+
+def _merge(old, new:dict):
+    # Атрибуты после правки; вес, равный прежнему, остаётся в прежнем виде
+    merged = {**(old or {}), **new}
+    if old is not None and 'weight' in old and 'weight' in new and _same_weight(old['weight'], new['weight']):
+        merged['weight'] = old['weight']
+    return merged
+
+
+def node_edit(G, node, attrs:dict, edges:dict):
+    # Правка узла из панели: новые атрибуты узла и полный набор его граней
+    # {сосед: атрибуты} (у орграфа - исходящих). Прочие атрибуты сохраняются
+    before = dict(G.nodes[node]) if node in G else None
+    nodes = {}
+    after = _merge(before, attrs)
+    if after != before:
+        nodes[node] = (before, after)
+
+    current = {v: data for _, v, data in G.edges(node, data=True)} if node in G else {}
+    changes = {}
+    for nbr, data in current.items():
+        if nbr not in edges:
+            changes[(node, nbr)] = (dict(data), None)
+    for nbr, data in edges.items():
+        old = current.get(nbr)
+        new = _merge(old, data)
+        if new != old:
+            changes[(node, nbr)] = (dict(old) if old is not None else None, new)
+        # Сосед, которого ещё нет, создаётся вместе с гранью
+        if nbr not in G and nbr != node and nbr not in nodes:
+            nodes[nbr] = (None, {})
+
+    if not nodes and not changes:
+        return None
+    return Edit(nodes, changes)
+
+
+def rebase_edit(G, edit:Edit):
+    # Та же правка поверх другого состояния графа: "до" берётся из G,
+    # удалять то, чего в G нет, не нужно, а грани удаляемого узла, которых
+    # не было в правке, удаляются вместе с ним. -> None, если менять нечего
+    nodes = {}
+    for node, (_, after) in edit.nodes.items():
+        before = dict(G.nodes[node]) if node in G else None
+        if before != after:
+            nodes[node] = (before, after)
+
+    edges = {}
+    for (u, v), (_, after) in edit.edges.items():
+        before = dict(G.edges[u, v]) if G.has_edge(u, v) else None
+        if before == after:
+            continue
+        edges[(u, v)] = (before, after)
+        if after is not None:
+            for end in (u, v):
+                if end not in G and end not in nodes:
+                    nodes[end] = (None, {})
+
+    for node, (_, after) in list(nodes.items()):
+        if after is None:
+            for (u, v), change in remove_edit(G, node).edges.items():
+                if (u, v) not in edges and (G.is_directed() or (v, u) not in edges):
+                    edges[(u, v)] = change
+
+    if not nodes and not edges:
+        return None
+    return Edit(nodes, edges)
+
+
+def remove_edit(G, node):
+    edges = {(u, v): (dict(data), None) for u, v, data in G.edges(node, data=True)}
+    if G.is_directed():
+        edges.update({(u, v): (dict(data), None) for u, v, data in G.in_edges(node, data=True)})
+    return Edit({node: (dict(G.nodes[node]), None)}, edges)
+
+
+def apply_edit(G, edit:Edit):
+    # Узлы создаются до граней, а удаляются после них
+    for node, (_, after) in edit.nodes.items():
+        if after is not None:
+            G.add_node(node)
+            G.nodes[node].clear()
+            G.nodes[node].update(after)
+    for (u, v), (_, after) in edit.edges.items():
+        if after is None:
+            G.remove_edge(u, v)
+        else:
+            G.add_edge(u, v)
+            G.edges[u, v].clear()
+            G.edges[u, v].update(after)
+    for node, (_, after) in edit.nodes.items():
+        if after is None:
+            G.remove_node(node)
+
+
+class Journal:
+    # Журнал правок для отмены и повтора. Хранятся только разницы, так что
+    # отмена стоит столько же, сколько сама правка
+
+    def __init__(self, limit=200):
+        self.limit = limit
+        self._undo = []
+        self._redo = []
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+
+    def record(self, edit:Edit):
+        self._undo.append(edit)
+        if len(self._undo) > self.limit:
+            del self._undo[0]
+        self._redo.clear()
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo(self):
+        # -> правка, которую нужно применить, чтобы откатиться
+        edit = self._undo.pop()
+        self._redo.append(edit)
+        return edit.reversed()
+
+    def redo(self):
+        edit = self._redo.pop()
+        self._undo.append(edit)
+        return edit
@@ -0,0 +1,101 @@
+from bisect import bisect_left, insort
+
+import numpy as np
+
+
+class SpatialIndex:
+    # Равномерная сетка над массивом позиций узлов. Узлы отсортированы по
+    # номеру клетки, так что клетки одного столбца лежат подряд
+
+    def __init__(self, pos):
+        self.pos = pos
+        self.nodes = list(pos)
+        self.xy = np.array([pos[node] for node in self.nodes], dtype=float).reshape(-1, 2)
+
+        n = len(self.nodes)
+        self.cells = max(1, int(np.ceil(np.sqrt(n / 2))))
+        if n:
+            self.low = self.xy.min(0)
+            self.size = np.maximum(self.xy.max(0) - self.low, 1e-9) / self.cells
+        else:
+            self.low = np.zeros(2)
+            self.size = np.ones(2)
+
+        cell = self._cell_ids(self.xy)
+        self.order = np.argsort(cell, kind='stable')
+        self.sorted_cells = cell[self.order]
+
+    def _cell_ij(self, xy):
+        return np.clip(((xy - self.low) / self.size).astype(np.intp), 0, self.cells - 1)
+
+    def _cell_ids(self, xy):
+        ij = self._cell_ij(xy)
+        return ij[:, 0] * self.cells + ij[:, 1]
+
+    def in_box(self, x0, y0, x1, y1):
+        # Номера узлов в прямоугольнике в координатах данных
+        if not self.nodes:
+            return np.empty(0, dtype=np.intp)
+        (i0, j0), (i1, j1) = self._cell_ij(np.array([(x0, y0), (x1, y1)], dtype=float))
+        parts = []
+        for i in range(i0, i1 + 1):
+            start = np.searchsorted(self.sorted_cells, i * self.cells + j0, side='left')
+            stop = np.searchsorted(self.sorted_cells, i * self.cells + j1, side='right')
+            parts.append(self.order[start:stop])
+        found = np.concatenate(parts)
+        xy = self.xy[found]
+        inside = (xy[:, 0] >= x0) & (xy[:, 0] <= x1) & (xy[:, 1] >= y0) & (xy[:, 1] <= y1)
+        return found[inside]
+
+    def nearest(self, transform, x, y, radius):
+        # Ближайший узел не дальше radius пикселей от точки (x, y) на экране.
+        # transform переводит координаты данных в пиксели (ax.transData)
+        corners = transform.inverted().transform([(x - radius, y - radius), (x + radius, y + radius)])
+        (x0, y0), (x1, y1) = corners.min(0), corners.max(0)
+        found = self.in_box(x0, y0, x1, y1)
+        if not len(found):
+            return None
+
+        dist2 = ((transform.transform(self.xy[found]) - (x, y)) ** 2).sum(1)
+        best = np.argmin(dist2)
+        if dist2[best] > radius * radius:
+            return None
+        return self.nodes[found[best]]
+
+
+class NamePrefixIndex:
+    # Отсортированный список имён узлов: все имена с общим префиксом лежат
+    # подряд, их границы ищутся двоичным поиском
+
+    # Сколько имён из диапазона префикса просматривается для ранжирования
+    SCAN = 5000
+
+    def __init__(self, names=()):
+        self.names = sorted(names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        i = bisect_left(self.names, name)
+        return i < len(self.names) and self.names[i] == name
+
+    def add(self, name):
+        if name not in self:
+            insort(self.names, name)
+
+    def remove(self, name):
+        i = bisect_left(self.names, name)
+        if i < len(self.names) and self.names[i] == name:
+            del self.names[i]
+
+    def prefix_range(self, prefix):
+        start = bisect_left(self.names, prefix)
+        # '\U0010ffff' больше любого символа, который может идти за префиксом
+        return start, bisect_left(self.names, prefix + '\U0010ffff', start)
+
+    def matches(self, prefix, limit=10):
+        # Точное совпадение первым, дальше более короткие имена, потом по алфавиту
+        start, end = self.prefix_range(prefix)
+        candidates = self.names[start:min(end, start + self.SCAN)]
+        return sorted(candidates, key=lambda name: (name != prefix, len(name), name))[:limit]
@@ -0,0 +1,459 @@
+import mmap
+import os
+import re
+import struct
+
+import networkx as nx
+import numpy as np
+
+from graph_colors import pack_rgba, unpack_rgba
+
+
+_ID = r'"(?:[^"\\]|\\.)*"|-?(?:\.\d+|\d+(?:\.\d*)?)|[A-Za-z_\x80-\U0010ffff][\w\x80-\U0010ffff]*'
+
+# Лексемы DOT: пробелы и комментарии, строки в кавычках, стрелки,
+# знаки и идентификаторы/числа
+_TOKEN = re.compile(rf"""
+    (?P<skip>\s+|//[^\n]*(?:\n|$)|\#[^\n]*(?:\n|$)|/\*.*?\*/)
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<edgeop>->|--)
+  | (?P<punct>[{{}}\[\];,=:])
+  | (?P<id>{_ID})
+""", re.VERBOSE | re.DOTALL)
+
+# Незакрытые строка, комментарий, стрелка или число вида -.5 в конце прочитанного куска
+_UNFINISHED = re.compile(r'"(?:[^"\\]|\\.)*\\?$|/\*(?:(?!\*/).)*$|[/-]$|-?\.$', re.DOTALL)
+
+# Целый оператор узла или грани в одну строку, как их пишет pydot:
+# a [k=v, ...];  a -- b [k=v, ...];
+_STATEMENT = re.compile(rf"""
+    \s*(?P<u>{_ID})
+    (?:\s*(?P<op>->|--)\s*(?P<v>{_ID}))?
+    \s*(?:\[(?P<attrs>(?:"(?:[^"\\]|\\.)*"|[^"\]])*)\])?
+    \s*;
+""", re.VERBOSE)
+_ATTR = re.compile(rf'({_ID})\s*=\s*({_ID})')
+
+_KEYWORDS = {'strict', 'graph', 'digraph', 'node', 'edge', 'subgraph'}
+
+
+class DotError(ValueError):
+    pass
+
+
+def _unquote(value:str):
+    if value.startswith('"'):
+        value = value[1:-1].replace('\\\n', '').replace('\\"', '"')
+    return value
+
+
+class _DotParser:
+    # Разбор подмножества DOT за один проход по файлу кусками: узлы и грани
+    # с атрибутами, атрибуты графа; подграфы разворачиваются в общий граф.
+    # Однострочные операторы разбираются одним регулярным выражением,
+    # всё остальное - по лексемам
+
+    def __init__(self, file, size, chunk_size, progress):
+        self.file = file
+        self.size = size
+        self.chunk_size = chunk_size
+        self.progress = progress
+
+        self.text = ''
+        self.pos = 0
+        self.done = 0
+        self.eof = False
+        self.ahead = None
+
+    def fill(self):
+        chunk = self.file.read(self.chunk_size)
+        self.done += len(chunk)
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        if self.progress is not None and self.size:
+            self.progress(min(self.done / self.size, 1.0))
+
+    def next_token(self):
+        while True:
+            if self.pos >= len(self.text):
+                if self.eof:
+                    return 'eof', None
+                self.fill()
+                continue
+
+            match = _TOKEN.match(self.text, self.pos)
+            # Лексема может продолжаться в следующем куске
+            if not self.eof and (match is None or match.end() == len(self.text)):
+                if match is not None or _UNFINISHED.match(self.text, self.pos):
+                    self.fill()
+                    continue
+            if match is None:
+                raise DotError(f'Неожиданный символ {self.text[self.pos]!r}')
+
+            self.pos = match.end()
+            kind = match.lastgroup
+            if kind == 'skip':
+                continue
+            value = match.group()
+            if kind == 'id' and value.lower() in _KEYWORDS:
+                return 'keyword', value.lower()
+            if kind == 'string':
+                return 'id', _unquote(value)
+            if kind in ('id', 'edgeop'):
+                return kind, value
+            return value, value
+
+    def peek(self):
+        if self.ahead is None:
+            self.ahead = self.next_token()
+        return self.ahead
+
+    def take(self, *kinds):
+        token = self.peek()
+        if kinds and token[0] not in kinds:
+            raise DotError(f'Ожидалось {" или ".join(kinds)}, получено {token[1]!r}')
+        self.ahead = None
+        return token
+
+    def parse(self):
+        kind, value = self.take('keyword')
+        if value == 'strict':
+            kind, value = self.take('keyword')
+        if value not in ('graph', 'digraph'):
+            raise DotError(f'Неизвестный тип графа {value!r}')
+        self.G = nx.DiGraph() if value == 'digraph' else nx.Graph()
+        self.edgeop = '->' if value == 'digraph' else '--'
+        self.G.graph.update({'graph': {}, 'node': {}, 'edge': {}})
+        if self.peek()[0] == 'id':
+            self.G.graph['name'] = self.take()[1]
+        self.take('{')
+        self.statements()
+        self.take('}')
+        return self.G
+
+    def statements(self):
+        while True:
+            if self.ahead is None and self.fast_statement():
+                continue
+            if self.peek()[0] in ('}', 'eof'):
+                return
+            self.statement()
+            if self.peek()[0] == ';':
+                self.take()
+
+    def fast_statement(self):
+        while True:
+            match = _STATEMENT.match(self.text, self.pos)
+            if match is not None or self.eof or '\n' in self.text[self.pos:self.pos + 4096]:
+                break
+            self.fill()
+        if match is None:
+            return False
+
+        u, op, v = match.group('u', 'op', 'v')
+        if not u.startswith('"') and u.lower() in _KEYWORDS:
+            return False
+        if v is not None and not v.startswith('"') and v.lower() in _KEYWORDS:
+            return False
+        if op is not None and op != self.edgeop:
+            raise DotError(f'Грань {op} в графе с {self.edgeop}')
+
+        attrs = {}
+        if match.group('attrs'):
+            for key, value in _ATTR.findall(match.group('attrs')):
+                attrs[_unquote(key)] = _unquote(value)
+
+        if op is None:
+            self.G.add_node(_unquote(u), **attrs)
+        else:
+            self.G.add_edge(_unquote(u), _unquote(v), **attrs)
+        self.pos = match.end()
+        return True
+
+    def statement(self):
+        kind, value = self.peek()
+        if kind == 'keyword' and value in ('graph', 'node', 'edge'):
+            self.take()
+            self.G.graph[value].update(self.attributes())
+            return
+        if (kind == 'keyword' and value == 'subgraph') or kind == '{':
+            self.subgraph()
+            return
+
+        node = self.node_id()
+        if self.peek()[0] == '=':
+            self.take()
+            self.G.graph['graph'][node] = self.take('id')[1]
+            return
+
+        chain = [node]
+        while self.peek()[0] == 'edgeop':
+            op = self.take()[1]
+            if op != self.edgeop:
+                raise DotError(f'Грань {op} в графе с {self.edgeop}')
+            chain.append(self.node_id())
+        attrs = self.attributes()
+
+        if len(chain) == 1:
+            self.G.add_node(node, **attrs)
+        else:
+            for u, v in zip(chain, chain[1:]):
+                self.G.add_edge(u, v, **attrs)
+
+    def subgraph(self):
+        if self.peek()[0] == 'keyword':
+            self.take()
+            if self.peek()[0] == 'id':
+                self.take()
+        self.take('{')
+        self.statements()
+        self.take('}')
+
+    def node_id(self):
+        node = self.take('id')[1]
+        # Порты узлов (node:port:compass) отбрасываются
+        while self.peek()[0] == ':':
+            self.take()
+            self.take('id')
+        return node
+
+    def attributes(self):
+        attrs = {}
+        while self.peek()[0] == '[':
+            self.take()
+            while self.peek()[0] != ']':
+                key = self.take('id')[1]
+                self.take('=')
+                attrs[key] = self.take('id')[1]
+                if self.peek()[0] in (',', ';'):
+                    self.take()
+            self.take(']')
+        return attrs
+
+
+def read_dot(filename:str, progress=None, chunk_size=1 << 20):
+    # progress(доля) вызывается после каждого прочитанного куска
+    size = os.path.getsize(filename)
+    with open(filename, encoding='utf-8') as file:
+        return _DotParser(file, size, chunk_size, progress).parse()
+
+
+# Двоичный формат графа: заголовок и столбцы фиксированной ширины,
+# каждый выровнен на 8 байт, так что читается прямо из mmap без копий
+#
+#   MAGIC, flags, n узлов, m граней, k строк, длина блока строк
+#   строки (имена и подписи) через '\0', UTF-8
+#   node_name   int32[n]    номер строки
+#   node_weight float64[n]
+#   node_color  uint32[n]   0xRRGGBBAA
+#   node_desc   int32[n]    номер строки
+#   node_has    uint8[n]    какие атрибуты заданы: HAS_*
+#   edges       int32[m, 2] номера узлов
+#   edge_weight float64[m]
+#   edge_color  uint32[m]
+#   edge_has    uint8[m]
+MAGIC = b'GRAPHBN1'
+_HEADER = struct.Struct('<8sIIIIQ')
+HAS_WEIGHT = 1
+HAS_COLOR = 2
+HAS_DESC = 4
+DIRECTED = 1
+
+
+def _columns(n, m):
+    return [
+        ('node_name', np.int32, (n,)),
+        ('node_weight', np.float64, (n,)),
+        ('node_color', np.uint32, (n,)),
+        ('node_desc', np.int32, (n,)),
+        ('node_has', np.uint8, (n,)),
+        ('edges', np.int32, (m, 2)),
+        ('edge_weight', np.float64, (m,)),
+        ('edge_color', np.uint32, (m,)),
+        ('edge_has', np.uint8, (m,)),
+    ]
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _weight(value):
+    try:
+        return float(str(value).strip('"'))
+    except ValueError:
+        raise ValueError(f'Вес должен быть числом: {value!r}') from None
+
+
+def _weight_str(value):
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def graph_arrays(G):
+    # Граф networkx -> столбцы двоичного формата и таблица строк
+    strings = {}
+
+    # Значения уже без кавычек DOT (read_dot их снимает), кавычки внутри - часть текста
+    def intern(text):
+        return strings.setdefault(str(text), len(strings))
+
+    n = len(G)
+    index = {}
+    arrays = {name: np.zeros(shape, dtype) for name, dtype, shape in _columns(n, G.number_of_edges())}
+    for i, (node, data) in enumerate(G.nodes(data=True)):
+        index[node] = i
+        arrays['node_name'][i] = intern(node)
+        has = 0
+        if 'weight' in data:
+            arrays['node_weight'][i] = _weight(data['weight'])
+            has |= HAS_WEIGHT
+        if 'fillcolor' in data:
+            arrays['node_color'][i] = pack_rgba(data['fillcolor'])
+            has |= HAS_COLOR
+        if 'description' in data:
+            arrays['node_desc'][i] = intern(data['description'])
+            has |= HAS_DESC
+        arrays['node_has'][i] = has
+
+    for i, (u, v, data) in enumerate(G.edges(data=True)):
+        arrays['edges'][i] = index[u], index[v]
+        has = 0
+        if 'weight' in data:
+            arrays['edge_weight'][i] = _weight(data['weight'])
+            has |= HAS_WEIGHT
+        if 'fillcolor' in data:
+            arrays['edge_color'][i] = pack_rgba(data['fillcolor'])
+            has |= HAS_COLOR
+        arrays['edge_has'][i] = has
+
+    return arrays, list(strings)
+
+
+def write_graph_bin(G, filename:str):
+    arrays, strings = graph_arrays(G)
+    blob = '\0'.join(strings).encode('utf-8')
+    flags = DIRECTED if G.is_directed() else 0
+
+    with open(filename, 'wb') as file:
+        file.write(_HEADER.pack(MAGIC, flags, len(G), G.number_of_edges(), len(strings), len(blob)))
+        file.write(blob)
+        for name, _, _ in _columns(0, 0):
+            file.write(b'\0' * (_align(file.tell()) - file.tell()))
+            file.write(np.ascontiguousarray(arrays[name]).tobytes())
+
+
+def load_graph_arrays(filename:str):
+    # Столбцы двоичного файла как массивы поверх mmap, без чтения в память
+    with open(filename, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Любой повреждённый или обрезанный файл - ValueError, как и у read_dot:
+    # вызывающие ловят только его
+    if len(buffer) < _HEADER.size:
+        raise ValueError('Файл графа обрезан')
+    magic, flags, n, m, k, blob_size = _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError('Это не двоичный файл графа')
+
+    offset = _HEADER.size
+    if offset + blob_size > len(buffer):
+        raise ValueError('Файл графа обрезан')
+    strings = bytes(buffer[offset:offset + blob_size]).decode('utf-8').split('\0') if k else []
+    if len(strings) != k:
+        raise ValueError('Повреждена таблица строк')
+    offset += blob_size
+
+    arrays = {'directed': bool(flags & DIRECTED), 'strings': strings}
+    for name, dtype, shape in _columns(n, m):
+        offset = _align(offset)
+        count = int(np.prod(shape))
+        size = count * np.dtype(dtype).itemsize
+        if offset + size > len(buffer):
+            raise ValueError('Файл графа обрезан')
+        arrays[name] = np.frombuffer(buffer, dtype, count, offset).reshape(shape)
+        offset += size
+
+    # Номера строк и узлов должны попадать в таблицы
+    descs = arrays['node_desc'][(arrays['node_has'] & HAS_DESC) != 0]
+    for column, limit in ((arrays['node_name'], k), (descs, k), (arrays['edges'], n)):
+        if column.size and (column.min() < 0 or column.max() >= limit):
+            raise ValueError('Повреждены номера в файле графа')
+    return arrays
+
+
+def read_graph_bin(filename:str):
+    arrays = load_graph_arrays(filename)
+    strings = arrays['strings']
+    G = nx.DiGraph() if arrays['directed'] else nx.Graph()
+    G.graph.update({'graph': {}, 'node': {}, 'edge': {}})
+
+    names = [strings[i] for i in arrays['node_name'].tolist()]
+    has = arrays['node_has'].tolist()
+    weights = arrays['node_weight'].tolist()
+    colors = arrays['node_color'].tolist()
+    descs = arrays['node_desc'].tolist()
+    nodes = []
+    for name, flag, weight, color, desc in zip(names, has, weights, colors, descs):
+        data = {}
+        if flag & HAS_WEIGHT:
+            data['weight'] = _weight_str(weight)
+        if flag & HAS_COLOR:
+            data['fillcolor'] = color
+        if flag & HAS_DESC:
+            data['description'] = strings[desc]
+        nodes.append((name, data))
+    G.add_nodes_from(nodes)
+
+    has = arrays['edge_has'].tolist()
+    weights = arrays['edge_weight'].tolist()
+    colors = arrays['edge_color'].tolist()
+    edges = []
+    for (u, v), flag, weight, color in zip(arrays['edges'].tolist(), has, weights, colors):
+        data = {}
+        if flag & HAS_WEIGHT:
+            data['weight'] = _weight_str(weight)
+        if flag & HAS_COLOR:
+            data['fillcolor'] = color
+        edges.append((names[u], names[v], data))
+    G.add_edges_from(edges)
+    return G
+
+
+def is_graph_bin(filename:str):
+    with open(filename, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def pack_colors(G):
+    # Строки цветов -> упакованные числа, каждая строка разбирается один раз
+    packed = {}
+    for data in [data for _, data in G.nodes(data=True)] + [data for _, _, data in G.edges(data=True)]:
+        color = data.get('fillcolor')
+        if color is not None and not isinstance(color, int):
+            if color not in packed:
+                packed[color] = pack_rgba(color)
+            data['fillcolor'] = packed[color]
+    return G
+
+
+def read_graph(filename:str, progress=None):
+    # Формат определяется по первым байтам файла. Цвета в результате
+    # всегда упакованы, см. graph_colors
+    if is_graph_bin(filename):
+        G = read_graph_bin(filename)
+        if progress is not None:
+            progress(1.0)
+        return G
+    return pack_colors(read_dot(filename, progress=progress))
+
+
+def write_dot(G, filename:str):
+    # Цвета записываются строками 'rgb(r,g,b)', как их понимает чтение
+    H = G.copy()
+    for data in [data for _, data in H.nodes(data=True)] + [data for _, _, data in H.edges(data=True)]:
+        if 'fillcolor' in data:
+            data['fillcolor'] = unpack_rgba(pack_rgba(data['fillcolor']))
+    nx.nx_pydot.write_dot(H, filename)
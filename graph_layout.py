@@ -0,0 +1,465 @@
+import threading
+from collections import OrderedDict
+
+import networkx as nx
+import numpy as np
+
+
+def graph_rankdir(G):
+    return G.graph.get('graph', {}).get('rankdir')
+
+
+# Окрестность правки для дорасстановки: шагов от затронутых узлов и предел узлов
+INCREMENTAL_HOPS = 2
+INCREMENTAL_BUDGET = 2000
+# Притяжение несвязанных с рисунком компонент при дорасстановке
+GRAVITY = 0.1
+
+
+def _node_hash(node):
+    return hash(('node', node))
+
+
+def _edge_hash(directed, u, v):
+    return hash(('edge', u, v) if directed else ('edge', frozenset((u, v))))
+
+
+def graph_fingerprint(G):
+    # Структурный отпечаток графа: только то, что может сдвинуть узлы.
+    # Хэши узлов и граней складываются по XOR, так что после правки
+    # отпечаток пересчитывается по ней одной (edit_fingerprint)
+    directed = G.is_directed()
+    nodes = 0
+    for node in G:
+        nodes ^= _node_hash(node)
+    edges = 0
+    for u, v in G.edges():
+        edges ^= _edge_hash(directed, u, v)
+    return (directed, graph_rankdir(G), G.number_of_nodes(), G.number_of_edges(), nodes, edges)
+
+
+def edit_fingerprint(fingerprint, edit):
+    # Отпечаток графа после правки edit: меняют его только появившиеся
+    # и исчезнувшие узлы и грани
+    directed, rankdir, n, m, nodes, edges = fingerprint
+    for node, (before, after) in edit.nodes.items():
+        if (before is None) != (after is None):
+            nodes ^= _node_hash(node)
+            n += 1 if before is None else -1
+    for (u, v), (before, after) in edit.edges.items():
+        if (before is None) != (after is None):
+            edges ^= _edge_hash(directed, u, v)
+            m += 1 if before is None else -1
+    return (directed, rankdir, n, m, nodes, edges)
+
+
+def layout_snapshot(G):
+    # Копия одной структуры графа для раскладки в другом потоке
+    H = G.__class__()
+    H.graph.update(G.graph)
+    H.add_nodes_from(G)
+    H.add_edges_from(G.edges())
+    return H
+
+
+def local_snapshot(G, nodes, hops=INCREMENTAL_HOPS, budget=INCREMENTAL_BUDGET):
+    # Копия окрестности nodes для incremental_layout: узлы в пределах hops
+    # шагов, не больше budget, и грани между ними, по которым шёл обход.
+    # Грани самих nodes берутся все, дальше обход останавливается на пределе,
+    # так что размер копии - по правке, а не по графу
+    H = G.__class__()
+    H.graph.update(G.graph)
+    seen = {node for node in nodes if node in G}
+    H.add_nodes_from(seen)
+    frontier = list(seen)
+    for hop in range(hops):
+        next_frontier = []
+        for node in frontier:
+            if hop and len(seen) >= budget:
+                break
+            if G.is_directed():
+                around = [(node, other) for other in G.succ[node]] + [(other, node) for other in G.pred[node]]
+            else:
+                around = [(node, other) for other in G.adj[node]]
+            for u, v in around:
+                other = v if u == node else u
+                if other not in seen:
+                    if len(seen) >= budget:
+                        continue
+                    seen.add(other)
+                    next_frontier.append(other)
+                H.add_edge(u, v)
+        frontier = next_frontier
+    return H
+
+
+def graphviz_layout(G, cancelled=None):
+    # Процесс dot не прерывается, устаревший результат просто отбрасывается.
+    # Пустому графу раскладка не нужна, а pydot импортируется только здесь
+    if len(G) == 0:
+        return {}
+    return nx.nx_pydot.pydot_layout(G)
+
+
+def _edge_array(G, index):
+    edges = [(index[u], index[v]) for u, v in G.edges() if u != v]
+    return np.array(edges, dtype=np.intp).reshape(-1, 2)
+
+
+def _exact_repulsion(xy, k2):
+    delta = xy[:, None, :] - xy[None, :, :]
+    dist2 = np.maximum((delta ** 2).sum(-1), 1e-4 * k2)
+    np.fill_diagonal(dist2, np.inf)
+    return (delta * (k2 / dist2)[..., None]).sum(1)
+
+
+def _grid_repulsion(xy, k2, cells):
+    # Узлы раскладываются по сетке cells x cells. Дальние клетки действуют
+    # на центр масс клетки целиком, соседние 3x3 - на каждый узел отдельно
+    low = xy.min(0)
+    span = np.maximum(xy.max(0) - low, 1e-9)
+    ij = np.minimum(((xy - low) / span * cells).astype(np.intp), cells - 1)
+    cell = ij[:, 0] * cells + ij[:, 1]
+
+    mass = np.bincount(cell, minlength=cells * cells).astype(float)
+    centre = np.stack((
+        np.bincount(cell, xy[:, 0], minlength=cells * cells),
+        np.bincount(cell, xy[:, 1], minlength=cells * cells),
+    ), axis=1) / np.maximum(mass, 1)[:, None]
+
+    occupied = np.flatnonzero(mass)
+    occ_i, occ_j = np.divmod(occupied, cells)
+    delta = centre[occupied, None, :] - centre[None, occupied, :]
+    dist2 = np.maximum((delta ** 2).sum(-1), 1e-4 * k2)
+    near = (np.abs(occ_i[:, None] - occ_i[None, :]) <= 1) & (np.abs(occ_j[:, None] - occ_j[None, :]) <= 1)
+    weight = np.where(near, 0, mass[occupied][None, :] * k2 / dist2)
+    far = np.zeros((cells * cells, 2))
+    far[occupied] = (delta * weight[..., None]).sum(1)
+
+    force = far[cell]
+    for di in (-1, 0, 1):
+        for dj in (-1, 0, 1):
+            ni = ij[:, 0] + di
+            nj = ij[:, 1] + dj
+            valid = (ni >= 0) & (ni < cells) & (nj >= 0) & (nj < cells)
+            other = np.where(valid, ni * cells + nj, 0)
+            other_mass = np.where(valid, mass[other], 0)
+            other_centre = centre[other]
+            if di == 0 and dj == 0:
+                # Своя клетка считается без самого узла
+                other_mass = other_mass - 1
+                other_centre = (other_centre * mass[other][:, None] - xy) / np.maximum(other_mass, 1)[:, None]
+            delta = xy - other_centre
+            dist2 = np.maximum((delta ** 2).sum(-1), 1e-4 * k2)
+            force += delta * (other_mass * k2 / dist2)[:, None]
+    return force
+
+
+def force_layout(G, iterations=50, pos=None, seed=0, exact_limit=200, scale=100.0, cancelled=None):
+    # Силовая раскладка Фрюхтермана-Рейнгольда на массивах NumPy. Точное
+    # отталкивание держит временные массивы (n, n, 2), поэтому только до
+    # exact_limit узлов; дальше сетка не хуже по качеству и на порядки быстрее
+    nodes = list(G)
+    n = len(nodes)
+    if n == 0:
+        return {}
+    if n == 1:
+        return {nodes[0]: (0.0, 0.0)}
+
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = _edge_array(G, index)
+
+    k = 1 / np.sqrt(n)
+    k2 = k * k
+    rng = np.random.default_rng(seed)
+    xy = rng.random((n, 2))
+    if pos:
+        known = [(index[node], p) for node, p in pos.items() if node in index]
+        if known:
+            ids, coords = zip(*known)
+            xy[list(ids)] = np.asarray(coords, dtype=float) * (k / scale)
+
+    cells = int(np.clip(2 * n ** 0.25, 4, 64))
+    temperature = 0.1 * max(np.ptp(xy, axis=0).max(), 1)
+    cooling = temperature / (iterations + 1)
+
+    for _ in range(iterations):
+        if cancelled is not None and cancelled():
+            return None
+        if n <= exact_limit:
+            disp = _exact_repulsion(xy, k2)
+        else:
+            disp = _grid_repulsion(xy, k2, cells)
+
+        if len(edges):
+            delta = xy[edges[:, 0]] - xy[edges[:, 1]]
+            dist = np.sqrt((delta ** 2).sum(-1))
+            pull = delta * (dist / k)[:, None]
+            for axis in (0, 1):
+                disp[:, axis] -= np.bincount(edges[:, 0], pull[:, axis], minlength=n)
+                disp[:, axis] += np.bincount(edges[:, 1], pull[:, axis], minlength=n)
+
+        # Слабое притяжение к центру, чтобы компоненты не разлетались
+        disp -= 0.1 * (xy - xy.mean(0)) / k
+
+        length = np.maximum(np.sqrt((disp ** 2).sum(-1)), 1e-12)
+        xy += disp * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+
+    xy *= scale / k
+    return {node: (float(x), float(y)) for node, (x, y) in zip(nodes, xy)}
+
+
+def _place_new_nodes(G, pos, new_nodes, k, rng):
+    # Новый узел ставится рядом с уже размещёнными соседями,
+    # узлы без таких соседей - в столбик справа от рисунка
+    pending = set(new_nodes)
+    while pending:
+        placed = []
+        for node in pending:
+            around = [pos[other] for other in nx.all_neighbors(G, node) if other in pos]
+            if around:
+                x, y = np.mean(around, axis=0) + rng.normal(scale=k / 2, size=2)
+                placed.append((node, (float(x), float(y))))
+        if not placed:
+            break
+        for node, p in placed:
+            pos[node] = p
+            pending.discard(node)
+
+    if pending:
+        if pos:
+            xy = np.array(list(pos.values()))
+            x = xy[:, 0].max() + k
+            y = xy[:, 1].mean()
+        else:
+            x = y = 0.0
+        for i, node in enumerate(sorted(pending, key=str)):
+            pos[node] = (float(x), float(y - i * k))
+
+
+def incremental_layout(G, prev_pos, touched, iterations=30, hops=INCREMENTAL_HOPS, budget=INCREMENTAL_BUDGET,
+                       seed=0, cancelled=None):
+    # Дорасстановка после правки: двигаются только новые и затронутые узлы,
+    # остальные остаются на местах и учитываются только в окрестности правки.
+    # G - весь граф или его окрестность вокруг touched (local_snapshot): узлы
+    # появляются и исчезают только среди touched, остальные есть в prev_pos
+    pos = dict(prev_pos)
+    for node in touched:
+        if node not in G:
+            pos.pop(node, None)
+    moving = {node for node in touched if node in G}
+    new_nodes = [node for node in moving if node not in pos]
+    if not moving:
+        return pos
+
+    rng = np.random.default_rng(seed)
+
+    lengths = [np.hypot(pos[u][0] - pos[v][0], pos[u][1] - pos[v][1])
+               for node in moving if node in pos
+               for u, v in G.edges(node) if u in pos and v in pos and u != v]
+    if not lengths and len(pos) > 1:
+        xy = np.array(list(pos.values()))
+        lengths = [np.ptp(xy, axis=0).max() / np.sqrt(len(xy))]
+    k = float(np.median(lengths)) if lengths and np.median(lengths) > 0 else 100.0
+
+    _place_new_nodes(G, pos, new_nodes, k, rng)
+
+    # Окрестность правки в пределах hops шагов, не больше budget узлов
+    context = list(moving)
+    seen = set(moving)
+    frontier = list(moving)
+    for _ in range(hops):
+        next_frontier = []
+        for node in frontier:
+            for other in nx.all_neighbors(G, node):
+                if other not in seen and len(seen) < budget:
+                    seen.add(other)
+                    context.append(other)
+                    next_frontier.append(other)
+        frontier = next_frontier
+
+    index = {node: i for i, node in enumerate(context)}
+    xy = np.array([pos[node] for node in context], dtype=float)
+    n_moving = len(moving)
+    pairs = set()
+    for node in context[:n_moving]:
+        for u, v in nx.edges(G, node):
+            if u != v and u in index and v in index:
+                pairs.add(tuple(sorted((index[u], index[v]))))
+        if G.is_directed():
+            for u, v in G.in_edges(node):
+                if u != v and u in index:
+                    pairs.add(tuple(sorted((index[u], index[v]))))
+    edges = np.array(sorted(pairs), dtype=np.intp).reshape(-1, 2)
+
+    # Компоненты из одних двигающихся узлов не держатся ни за один узел на
+    # месте и от правки к правке уплывали бы от рисунка. Их слабо тянет
+    # к центру, но только снаружи круга, в котором лежит почти весь рисунок
+    anchored = np.zeros(len(xy), dtype=bool)
+    anchored[n_moving:] = True
+    while len(edges):
+        spread = anchored.copy()
+        np.logical_or.at(spread, edges[:, 0], anchored[edges[:, 1]])
+        np.logical_or.at(spread, edges[:, 1], anchored[edges[:, 0]])
+        if np.array_equal(spread, anchored):
+            break
+        anchored = spread
+    free = np.flatnonzero(~anchored[:n_moving])
+    if len(free) and len(pos) > len(free):
+        xy_all = np.array(list(pos.values()))
+        centre = xy_all.mean(0)
+        radius = np.percentile(np.hypot(*(xy_all - centre).T), 95)
+
+    k2 = k * k
+    temperature = k
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        if cancelled is not None and cancelled():
+            return None
+        delta = xy[:n_moving, None, :] - xy[None, :, :]
+        dist2 = np.maximum((delta ** 2).sum(-1), 1e-4 * k2)
+        dist2[np.arange(n_moving), np.arange(n_moving)] = np.inf
+        disp = (delta * (k2 / dist2)[..., None]).sum(1)
+
+        if len(edges):
+            delta = xy[edges[:, 0]] - xy[edges[:, 1]]
+            dist = np.sqrt((delta ** 2).sum(-1))
+            pull = delta * (dist / k)[:, None]
+            for axis in (0, 1):
+                disp[:, axis] -= np.bincount(edges[:, 0], pull[:, axis], minlength=len(xy))[:n_moving]
+                disp[:, axis] += np.bincount(edges[:, 1], pull[:, axis], minlength=len(xy))[:n_moving]
+
+        if len(free) and len(pos) > len(free):
+            offset = xy[free] - centre
+            dist = np.maximum(np.hypot(*offset.T), 1e-12)
+            disp[free] -= offset * (GRAVITY * np.maximum(dist - radius, 0) / dist)[:, None]
+
+        length = np.maximum(np.sqrt((disp ** 2).sum(-1)), 1e-12)
+        xy[:n_moving] += disp * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+
+    for node, (x, y) in zip(context[:n_moving], xy[:n_moving]):
+        pos[node] = (float(x), float(y))
+    return pos
+
+
+LAYOUT_ENGINES = {
+    'graphviz': graphviz_layout,
+    'force': force_layout,
+}
+
+
+class LayoutCache:
+    def __init__(self, engine='graphviz', maxsize=4):
+        self.engine = engine
+        self.maxsize = maxsize
+        # Дорасстановка правок от предыдущей раскладки вместо полной
+        self.incremental = False
+
+        # {(engine, fingerprint): pos}, последние использованные в конце
+        self._layouts = OrderedDict()
+        self._pos = None
+        self._dirty = True
+        # Узлы, затронутые правками с прошлой раскладки; None - всё заново
+        self._touched = None
+        # Отпечаток текущего графа, обновляется правками; None - посчитать обходом
+        self._fingerprint = None
+
+    def set_engine(self, engine:str):
+        if engine != self.engine:
+            self.engine = engine
+            self.invalidate()
+
+    def invalidate(self, nodes=None):
+        self._dirty = True
+        if nodes is None:
+            self._touched = None
+            self._fingerprint = None
+        elif self._touched is not None:
+            self._touched.update(nodes)
+
+    def edited(self, edit):
+        # Правка уже применена к графу: отпечаток обновляется по ней, без обхода
+        if self._fingerprint is not None:
+            self._fingerprint = edit_fingerprint(self._fingerprint, edit)
+        self.invalidate(edit.touched())
+
+    def clear(self):
+        self._layouts.clear()
+        self._pos = None
+        self._dirty = True
+        self._touched = None
+        self._fingerprint = None
+
+    def lookup(self, G):
+        # (ключ, раскладка); раскладка None, если её надо считать заново
+        if not self._dirty and self._pos is not None and len(self._pos) == len(G):
+            return None, self._pos
+
+        if self._fingerprint is None:
+            self._fingerprint = graph_fingerprint(G)
+        key = (self.engine, self._fingerprint)
+        pos = self._layouts.get(key)
+        if pos is None and len(G) == 0:
+            # Пустой граф раскладывается сразу, без рабочего потока и dot
+            pos = {}
+            self.remember(key, pos)
+        if pos is not None:
+            self._layouts.move_to_end(key)
+            self._apply(pos)
+        return key, pos
+
+    def request(self, G, key):
+        # Задание на раскладку по снимку графа, безопасное для другого потока.
+        # Дорасстановке хватает копии окрестности правок
+        if self.incremental and self._touched is not None and self._pos:
+            prev_pos = self._pos
+            touched = set(self._touched)
+            H = local_snapshot(G, touched)
+            compute = lambda cancelled: incremental_layout(H, prev_pos, touched, cancelled=cancelled)
+        else:
+            H = layout_snapshot(G)
+            engine = LAYOUT_ENGINES[self.engine]
+            compute = lambda cancelled: engine(H, cancelled=cancelled)
+        return LayoutJob(key, compute)
+
+    def remember(self, key, pos):
+        self._layouts[key] = pos
+        self._layouts.move_to_end(key)
+        if len(self._layouts) > self.maxsize:
+            self._layouts.popitem(last=False)
+
+    def store(self, key, pos):
+        self.remember(key, pos)
+        self._apply(pos)
+
+    def get(self, G):
+        key, pos = self.lookup(G)
+        if pos is None:
+            pos = self.request(G, key).run()
+            self.store(key, pos)
+        return pos
+
+    def _apply(self, pos):
+        self._pos = pos
+        self._dirty = False
+        self._touched = set()
+
+
+class LayoutJob:
+    def __init__(self, key, compute):
+        self.key = key
+        self.compute = compute
+        # Номер ревизии графа, для которой считается раскладка
+        self.revision = None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def run(self):
+        return self.compute(self.cancelled)
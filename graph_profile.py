@@ -0,0 +1,126 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class _NoSpan:
+    # Общий пустой контекст: выключенный профилировщик не создаёт объектов
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    # Именованные отрезки времени по фазам: последние значения и скользящее
+    # среднее для вывода поверх холста, лента событий для трассы Chrome.
+    # Пока профилировщик выключен, span() - одна проверка флага
+
+    def __init__(self, events=20000, window=20):
+        self.enabled = False
+        self.events = deque(maxlen=events)
+        self.window = window
+        # {имя: deque последних длительностей}
+        self.durations = {}
+        # record зовут и рабочие потоки, а summary и export_chrome обходят
+        # durations и events в главном цикле
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    def span(self, name:str):
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name)
+
+    def record(self, name:str, start:float, duration:float):
+        # Можно звать из любого потока
+        with self.lock:
+            self.events.append((name, start, duration, threading.get_ident()))
+            durations = self.durations.get(name)
+            if durations is None:
+                durations = self.durations[name] = deque(maxlen=self.window)
+            durations.append(duration)
+
+    def summary(self):
+        # [(имя, последнее, среднее)] в секундах, по имени
+        with self.lock:
+            return [
+                (name, durations[-1], sum(durations) / len(durations))
+                for name, durations in sorted(self.durations.items()) if durations
+            ]
+
+    def summary_text(self):
+        return '\n'.join(
+            f'{name:<18} {last * 1000:8.1f} {average * 1000:8.1f} мс'
+            for name, last, average in self.summary()
+        )
+
+    def export_chrome(self, filename:str):
+        # Формат trace event: открывается в chrome://tracing и Perfetto
+        pid = os.getpid()
+        threads = {}
+        events = []
+        with self.lock:
+            recorded = list(self.events)
+        for name, start, duration, tid in recorded:
+            threads.setdefault(tid, len(threads))
+            events.append({
+                'name': name,
+                'cat': name.split('.')[0],
+                'ph': 'X',
+                'ts': (start - self.origin) * 1e6,
+                'dur': duration * 1e6,
+                'pid': pid,
+                'tid': threads[tid],
+            })
+        for tid, number in threads.items():
+            events.append({
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': pid,
+                'tid': number,
+                'args': {'name': 'main' if tid == threading.main_thread().ident else f'worker {number}'},
+            })
+        with open(filename, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+
+# Один профилировщик на процесс: модули берут отрезки отсюда
+profiler = Profiler()
+span = profiler.span
+
+
+def timed(name:str):
+    # Декоратор: весь вызов метода - один отрезок
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            with _Span(profiler, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,534 @@
+import numpy as np
+from matplotlib.backends.backend_agg import RendererAgg
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.figure import Figure
+from matplotlib.image import AxesImage
+from matplotlib.transforms import IdentityTransform
+
+from graph_colors import rgba_array
+from graph_profile import timed
+
+
+class GraphFigure(Figure):
+    # Фигура холста: отрисовка художников замеряется отдельно от подготовки
+    @timed('render.paint')
+    def draw(self, renderer):
+        super().draw(renderer)
+
+
+class RasterImage(AxesImage):
+    # Картинка кэшированных слоёв. При сохранении в файл рисуются сами
+    # художники в полном качестве, а картинка пропускается
+    def draw(self, renderer):
+        if self.get_figure(root=True).canvas.is_saving():
+            return
+        super().draw(renderer)
+
+
+class Raster:
+    # Снимок неподвижных слоёв для одного вида: пределы осей, пикселей на
+    # единицу данных и картинки под путём и над ним
+    def __init__(self, view, resolution, images):
+        self.view = view
+        self.resolution = resolution
+        self.images = images
+
+
+class GraphRenderer:
+    # Постоянные художники matplotlib по слоям. Между перерисовками они не
+    # пересоздаются, а меняются на месте: позиции, цвета, видимость, текст.
+    # Цвета и подписи берутся срезами столбцов GraphStore.
+    #
+    # Уровень детализации выбирается по видимой части холста: рисуется
+    # только то, что попало в окно, узлы ужимаются до среднего расстояния
+    # между ними, а подписи появляются, когда им хватает места. Иначе
+    # подписаны только выбранный узел и его соседи.
+    #
+    # С cached=True грани, узлы и подписи не рисуются холстом, а после
+    # выбора детализации растрируются в картинки. Сдвиг и масштаб (navigate)
+    # только перерисовывают эти картинки по новым пределам осей; заново
+    # растрируется, когда вид устоялся или поменялись граф, цвета и подписи
+
+    NODE_SIZE = 600
+    OUTLINE_SIZE = 750
+    # Меньше этого диаметра в пикселях обводка не рисуется
+    OUTLINE_MIN = 4
+    # Среднее расстояние между узлами в пикселях, с которого видны подписи
+    LABEL_SPACING = 48
+    PATH_COLOR = '#ff0000'
+    # Пунктирное кольцо у граничных узлов окрестности
+    BOUNDARY_COLOR = '#3584e4'
+    # Наконечник стрелки орграфа в пунктах: длина и полуширина
+    ARROW_LENGTH = 10
+    ARROW_WIDTH = 3.5
+    # Сколько снимков разного масштаба держать для одного содержимого
+    RASTER_LEVELS = 3
+
+    NAME_STYLE = {'size': 12, 'color': '#000000'}
+    ASTAR_STYLE = {'size': 12, 'color': '#ff0000'}
+    DESC_STYLE = {
+        'size': 12,
+        'color': '#ffffff',
+        'bbox': {'boxstyle': 'square', 'color': '#000000', 'alpha': 0.2}
+    }
+    EDGE_LABEL_STYLE = {
+        'size': 10,
+        'color': '#000000',
+        'zorder': 1,
+        'bbox': {'boxstyle': 'round', 'ec': (1.0, 1.0, 1.0), 'fc': (1.0, 1.0, 1.0)}
+    }
+
+    def __init__(self, ax, cached=False):
+        self.ax = ax
+        self.cached = cached
+        self.ax.tick_params(
+            axis='both',
+            which='both',
+            bottom=False,
+            left=False,
+            labelbottom=False,
+            labelleft=False
+        )
+
+        self.store = None
+        self.epoch = None
+        self.directed = False
+        self.node_rows = np.empty(0, dtype=np.intp)
+        self.edge_rows = np.empty(0, dtype=np.intp)
+        # Номер строки хранилища -> индекс в node_rows / edge_rows
+        self.node_at = np.empty(0, dtype=np.intp)
+        self.edge_at = np.empty(0, dtype=np.intp)
+        self.nodes = np.empty(0, dtype=object)
+        self.pos = {}
+        self.xy = np.empty((0, 2))
+        # Координаты по номеру строки хранилища, NaN у удалённых строк
+        self.xy_rows = np.empty((0, 2))
+        self.segments = np.empty((0, 2, 2))
+        # Номер раскладки
+        self.geometry = 0
+
+        # Все грани - одна коллекция, у орграфа к ней добавлены наконечники
+        self.edge_layer = LineCollection([], linewidths=1.5, alpha=0.55, zorder=1, animated=cached)
+        self.ax.add_collection(self.edge_layer, autolim=False)
+        self.arrow_layer = PolyCollection(
+            [], offsets=np.empty((0, 2)), offset_transform=self.ax.transData,
+            transform=IdentityTransform(), alpha=0.55, linewidths=0, zorder=1, animated=cached
+        )
+        self.ax.add_collection(self.arrow_layer, autolim=False)
+        # Найденный путь: грани поверх остальных, узлы - кольцом под узлами
+        self.path_layer = LineCollection(
+            [], colors=self.PATH_COLOR, linewidths=4, alpha=0.8, zorder=1.5
+        )
+        self.ax.add_collection(self.path_layer, autolim=False)
+        self.path_node_layer = self.ax.scatter(
+            np.empty(0), np.empty(0), s=self.OUTLINE_SIZE * 1.6, c=self.PATH_COLOR, zorder=1.9
+        )
+        self.outline_layer = self.ax.scatter(
+            np.empty(0), np.empty(0), s=self.OUTLINE_SIZE, c='#000000', alpha=0.55, zorder=2,
+            animated=cached
+        )
+        self.node_layer = self.ax.scatter(
+            np.empty(0), np.empty(0), s=self.NODE_SIZE, zorder=2, animated=cached
+        )
+        self.boundary_layer = self.ax.scatter(
+            np.empty(0), np.empty(0), s=self.OUTLINE_SIZE * 1.4, facecolors='none',
+            edgecolors=self.BOUNDARY_COLOR, linewidths=2, linestyles='--', zorder=1.95, animated=cached
+        )
+
+        self.node_color_map = np.empty((0, 4))
+        self.edge_color_map = np.empty((0, 4))
+        # Ревизия графа, по которой раскрашены слои
+        self.style_revision = None
+
+        # {слой: {ключ: Text}}
+        self.texts = {'names': {}, 'astar': {}, 'desc': {}, 'edges': {}}
+        self.show = {'edges': False, 'astar': False, 'desc': False}
+        self.label_pos = 0.5
+        # Выбранный узел, его и соседей подписываем при любом масштабе
+        self.focus = None
+        # Узлы найденного пути по порядку
+        self.path = []
+        # Узлы, у которых есть соседи вне показанного подграфа
+        self.boundary = ()
+        # Доля от полного размера узла при текущем масштабе
+        self.node_scale = 1.0
+        # По чему последний раз выбирался уровень детализации
+        self.view = None
+        # Снимки неподвижных слоёв для текущего содержимого, последний - в конце
+        self.rasters = []
+        self.raster_content = None
+
+    def hit_radius(self):
+        # Радиус обводки узла в пикселях экрана
+        radius = np.sqrt(self.OUTLINE_SIZE / np.pi) * self.ax.figure.dpi / 72
+        return max(radius * self.node_scale, self.OUTLINE_MIN)
+
+    def draw(self):
+        self.update_view()
+        self.ax.figure.canvas.draw_idle()
+
+    def navigate(self):
+        # Пределы осей поменялись при сдвиге или масштабе: снимки двигаются
+        # вместе с осями, детализация пересчитается при следующем draw()
+        if not self.cached or not self.rasters:
+            self.draw()
+            return
+        self.ax.figure.canvas.draw_idle()
+
+    def stale(self):
+        # Хранилище уплотнилось после раскладки: номера строк уже другие,
+        # до новой раскладки цвета и подписи не трогаем
+        return self.store is None or self.store.epoch != self.epoch
+
+    @timed('render.geometry')
+    def set_geometry(self, store, pos):
+        node_rows = store.node_rows()
+        edge_rows = store.edge_rows()
+        same_rows = store is self.store and store.epoch == self.epoch
+        same_nodes = same_rows and np.array_equal(node_rows, self.node_rows)
+        same_edges = same_rows and np.array_equal(edge_rows, self.edge_rows) \
+            and store.directed == self.directed
+        if pos is self.pos and same_nodes and same_edges:
+            return
+
+        self.store = store
+        self.epoch = store.epoch
+        self.pos = pos
+        self.geometry += 1
+        self.view = None
+        nodes = store.node_name[node_rows]
+        self.xy_rows = np.full((store.n_rows, 2), np.nan)
+        if len(node_rows):
+            self.xy_rows[node_rows] = np.array([pos[node] for node in nodes], dtype=float)
+        self.xy = self.xy_rows[node_rows]
+        self.segments = np.stack((
+            self.xy_rows[store.edge_src[edge_rows]],
+            self.xy_rows[store.edge_dst[edge_rows]]
+        ), axis=1).reshape(-1, 2, 2)
+
+        if not same_nodes:
+            self.style_revision = None
+            self.node_at = np.full(store.n_rows, -1, dtype=np.intp)
+            self.node_at[node_rows] = np.arange(len(node_rows))
+            # Подписи исчезнувших узлов убираются и из скрытых слоёв
+            self._prune(('names', 'astar', 'desc'), set(nodes))
+        if not same_edges:
+            self.style_revision = None
+            self.edge_at = np.full(store.m_rows, -1, dtype=np.intp)
+            self.edge_at[edge_rows] = np.arange(len(edge_rows))
+            self._prune(('edges',), set(store.edge_key[edge_rows]))
+        self.node_rows = node_rows
+        self.edge_rows = edge_rows
+        self.nodes = nodes
+        self.directed = store.directed
+
+        # Новая раскладка показывается целиком
+        self.ax.set_autoscale_on(True)
+        self.ax.ignore_existing_data_limits = True
+        if len(self.xy):
+            self.ax.update_datalim(self.xy)
+        self.ax.autoscale_view()
+
+    @timed('render.style')
+    def set_style(self, revision=None):
+        # Для той же ревизии графа цвета не пересчитываются
+        if self.stale() or revision is not None and revision == self.style_revision:
+            return
+        self.style_revision = revision
+        self.node_color_map = rgba_array(self.store.node_color[self.node_rows])
+        self.edge_color_map = rgba_array(self.store.edge_color[self.edge_rows])
+        self.view = None
+
+    def set_labels(self, show_edges=False, show_astar=False, show_desc=False, label_pos=0.5):
+        self.show = {'edges': show_edges, 'astar': show_astar, 'desc': show_desc}
+        self.label_pos = label_pos
+        self.view = None
+
+    def set_focus(self, node=None):
+        if node != self.focus:
+            self.focus = node
+            self.view = None
+
+    def set_path(self, path=()):
+        path = list(path)
+        if path != self.path:
+            self.path = path
+            self.view = None
+
+    def set_boundary(self, nodes=()):
+        nodes = tuple(sorted(nodes))
+        if nodes != self.boundary:
+            self.boundary = nodes
+            self.view = None
+
+    @timed('render.view')
+    def update_view(self):
+        # Выбор уровня детализации по видимой области. Пересчёт только если
+        # что-то поменялось: пределы осей, размер холста, данные или подписи
+        if self.stale():
+            return
+        xlim, ylim = self.ax.get_xlim(), self.ax.get_ylim()
+        bbox = self.ax.bbox
+        view = (xlim, ylim, bbox.width, bbox.height)
+        if view == self.view:
+            return
+        self.view = view
+
+        (x0, x1), (y0, y1) = sorted(xlim), sorted(ylim)
+        # Поле в данных на радиус узла, чтобы не обрезать узлы у края
+        pad_x = (x1 - x0) * self.hit_radius() / max(bbox.width, 1)
+        pad_y = (y1 - y0) * self.hit_radius() / max(bbox.height, 1)
+        x0, x1, y0, y1 = x0 - pad_x, x1 + pad_x, y0 - pad_y, y1 + pad_y
+
+        xy = self.xy
+        in_view = (xy[:, 0] >= x0) & (xy[:, 0] <= x1) & (xy[:, 1] >= y0) & (xy[:, 1] <= y1)
+        shown_nodes = np.flatnonzero(in_view)
+
+        # Узлы ужимаются до среднего расстояния между видимыми узлами
+        spacing = np.sqrt(bbox.width * bbox.height / max(len(shown_nodes), 1))
+        full = np.sqrt(self.NODE_SIZE) * self.ax.figure.dpi / 72
+        self.node_scale = min(1.0, spacing / full)
+        detailed = spacing >= self.LABEL_SPACING
+
+        self.node_layer.set_offsets(xy[shown_nodes])
+        self.node_layer.set_sizes([self.NODE_SIZE * self.node_scale ** 2])
+        self.node_layer.set_facecolor(self.node_color_map[shown_nodes])
+        outlined = full * self.node_scale >= self.OUTLINE_MIN
+        self.outline_layer.set_visible(outlined)
+        if outlined:
+            self.outline_layer.set_offsets(xy[shown_nodes])
+            self.outline_layer.set_sizes([self.OUTLINE_SIZE * self.node_scale ** 2])
+
+        # Грань видна, если её рамка пересекает окно
+        segments = self.segments
+        lo, hi = segments.min(axis=1), segments.max(axis=1)
+        shown_edges = np.flatnonzero(
+            (hi[:, 0] >= x0) & (lo[:, 0] <= x1) & (hi[:, 1] >= y0) & (lo[:, 1] <= y1)
+        )
+        self.edge_layer.set_segments(segments[shown_edges])
+        self.edge_layer.set_color(self.edge_color_map[shown_edges])
+        self.arrow_layer.set_visible(self.directed and len(shown_edges) > 0)
+        if self.directed:
+            self._update_arrows(shown_edges)
+
+        boundary = self._node_indices(self.boundary)
+        boundary = boundary[in_view[boundary]]
+        self.boundary_layer.set_offsets(xy[boundary])
+        self.boundary_layer.set_sizes([self.OUTLINE_SIZE * 1.4 * self.node_scale ** 2])
+
+        path_nodes = self._path_nodes()
+        self.path_node_layer.set_offsets(xy[path_nodes])
+        self.path_node_layer.set_sizes([self.OUTLINE_SIZE * 1.6 * self.node_scale ** 2])
+        self.path_layer.set_segments(np.stack((xy[path_nodes[:-1]], xy[path_nodes[1:]]), axis=1))
+
+        if detailed:
+            label_nodes, label_edges = shown_nodes, shown_edges
+        else:
+            label_nodes, label_edges = self._focus_rows()
+            label_nodes = np.union1d(label_nodes, path_nodes)
+        self._update_labels(label_nodes, label_edges)
+
+        if self.cached:
+            self._update_rasters()
+
+    def _update_rasters(self):
+        content = (
+            self.store, self.geometry, self.style_revision, tuple(self.show.values()),
+            self.label_pos, self.focus, tuple(self.path), self.boundary
+        )
+        if content != self.raster_content:
+            # Граф, цвета или подписи поменялись - старые снимки не годятся
+            for raster in self.rasters:
+                for image in raster.images:
+                    image.remove()
+            self.rasters = []
+            self.raster_content = content
+
+        if self.ax.bbox.width < 1 or self.ax.bbox.height < 1:
+            return
+
+        # Тот же вид уже растрирован, например после приближения и отдаления
+        xlim, ylim = self.ax.get_xlim(), self.ax.get_ylim()
+        pixel = (xlim[1] - xlim[0]) / max(self.ax.bbox.width, 1)
+        for raster in self.rasters:
+            if raster.view[2:] == self.view[2:] and \
+                    np.allclose((*raster.view[0], *raster.view[1]), (*xlim, *ylim), rtol=0, atol=abs(pixel) / 2):
+                self.rasters.remove(raster)
+                self.rasters.append(raster)
+                break
+        else:
+            self.rasters.append(self._rasterize())
+            if len(self.rasters) > self.RASTER_LEVELS:
+                for image in self.rasters.pop(0).images:
+                    image.remove()
+
+        # Крупные снимки под мелкими, последний снимок поверх своего масштаба
+        order = sorted(self.rasters, key=lambda raster: raster.resolution)
+        for rank, raster in enumerate(order):
+            for zorder, image in zip((1, 2), raster.images):
+                image.set_zorder(zorder + rank * 0.01)
+
+    @timed('render.raster')
+    def _rasterize(self):
+        # Неподвижные слои рисуются в Agg отдельно от холста: то, что ниже
+        # слоя пути, и то, что выше, чтобы путь остался между ними. Без пути
+        # хватает одной картинки
+        figure = self.ax.figure
+        width, height = int(figure.bbox.width), int(figure.bbox.height)
+        x0, y0, x1, y1 = (int(round(value)) for value in self.ax.bbox.extents)
+        x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, width), min(y1, height)
+        renderer = RendererAgg(width, height, figure.dpi)
+
+        artists = [self.edge_layer, self.arrow_layer, self.outline_layer, self.node_layer, self.boundary_layer]
+        for texts in self.texts.values():
+            artists.extend(texts.values())
+        artists = sorted((artist for artist in artists if artist.get_visible()), key=lambda artist: artist.zorder)
+
+        # Иначе новая картинка растянула бы пределы осей под себя
+        self.ax.set_autoscale_on(False)
+        xlim, ylim = self.ax.get_xlim(), self.ax.get_ylim()
+        images = []
+        for below in ((True, False) if self.path else (None,)):
+            renderer.clear()
+            for artist in artists:
+                if below is None or (artist.zorder < self.path_layer.zorder) == below:
+                    artist.draw(renderer)
+            pixels = np.asarray(renderer.buffer_rgba())[height - y1:height - y0, x0:x1].copy()
+            image = RasterImage(self.ax, interpolation='nearest', origin='upper')
+            image.set_data(pixels)
+            image.set_extent((*xlim, *ylim))
+            image.set_in_layout(False)
+            self.ax.add_image(image)
+            image.set_clip_path(self.ax.patch)
+            images.append(image)
+        return Raster(self.view, (x1 - x0) / max(abs(xlim[1] - xlim[0]), 1e-12), images)
+
+    def _node_indices(self, nodes):
+        # Индексы в self.xy для узлов, которые есть на холсте
+        rows = [self.store.node_index.get(node) for node in nodes]
+        rows = np.array([row for row in rows if row is not None and row < len(self.node_at)], dtype=np.intp)
+        indices = self.node_at[rows]
+        return indices[indices >= 0]
+
+    def _path_nodes(self):
+        # Индексы узлов пути; путь по узлам, которых ещё нет на холсте, не рисуется
+        rows = [self.store.node_index.get(node) for node in self.path]
+        if any(row is None or row >= len(self.node_at) or self.node_at[row] < 0 for row in rows):
+            return np.empty(0, dtype=np.intp)
+        return self.node_at[np.array(rows, dtype=np.intp)]
+
+    def _focus_rows(self):
+        # Индексы выбранного узла, его соседей и его граней
+        store = self.store
+        row = store.node_index.get(self.focus)
+        if row is None or row >= len(self.node_at) or self.node_at[row] < 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        edge_rows = np.fromiter(store.node_edges[row], dtype=np.intp)
+        edge_rows = edge_rows[edge_rows < len(self.edge_at)]
+        edges = self.edge_at[edge_rows]
+        edges = edges[edges >= 0]
+        rows = np.concatenate(([row], store.edge_src[self.edge_rows[edges]], store.edge_dst[self.edge_rows[edges]]))
+        nodes = np.unique(self.node_at[rows])
+        return nodes[nodes >= 0], edges
+
+    def _update_arrows(self, shown_edges):
+        # Наконечники строятся в пикселях относительно конца грани,
+        # поэтому при смене масштаба их размер на экране не меняется
+        points = self.ax.figure.dpi / 72
+        ends = self.segments[shown_edges]
+        if not len(ends):
+            self.arrow_layer.set_verts([])
+            self.arrow_layer.set_offsets(np.empty((0, 2)))
+            return
+        start = self.ax.transData.transform(ends[:, 0])
+        end = self.ax.transData.transform(ends[:, 1])
+        direction = end - start
+        length = np.hypot(direction[:, 0], direction[:, 1])[:, None]
+        direction = np.divide(direction, length, out=np.zeros_like(direction), where=length > 0)
+        normal = direction[:, ::-1] * (-1, 1)
+
+        radius = np.sqrt(self.OUTLINE_SIZE) / 2 * points * self.node_scale
+        tip = -direction * radius
+        base = tip - direction * self.ARROW_LENGTH * points
+        side = normal * self.ARROW_WIDTH * points
+        self.arrow_layer.set_verts(np.stack((tip, base + side, base - side), axis=1))
+        self.arrow_layer.set_offsets(ends[:, 1])
+        self.arrow_layer.set_facecolor(self.edge_color_map[shown_edges])
+
+    @timed('render.labels')
+    def _update_labels(self, label_nodes, label_edges):
+        store = self.store
+        nodes = self.nodes[label_nodes]
+        rows = self.node_rows[label_nodes]
+        xy = self.xy[label_nodes]
+
+        # Отрисовка имён узлов
+        self._update_texts('names', nodes, store.node_label[rows], xy, self.NAME_STYLE)
+
+        # Отрисовка весов граней
+        if self.show['edges']:
+            edge_rows = self.edge_rows[label_edges]
+            ends = self.segments[label_edges]
+            positions = ends[:, 0] * self.label_pos + ends[:, 1] * (1 - self.label_pos)
+            self._update_texts(
+                'edges', store.edge_key[edge_rows], store.edge_weight[edge_rows], positions,
+                self.EDGE_LABEL_STYLE
+            )
+        else:
+            self._hide('edges')
+
+        # Отрисовка весов узлов
+        if self.show['astar']:
+            weights = store.node_weight[rows]
+            shown = weights != ''
+            self._update_texts(
+                'astar', nodes[shown], '\n\n\n\n' + weights[shown], xy[shown], self.ASTAR_STYLE
+            )
+        else:
+            self._hide('astar')
+
+        # Отрисовка подписей
+        if self.show['desc']:
+            descs = store.node_desc[rows]
+            shown = descs != ''
+            self._update_texts('desc', nodes[shown], descs[shown], xy[shown], self.DESC_STYLE)
+        else:
+            self._hide('desc')
+
+    def _prune(self, layers, keys):
+        for layer in layers:
+            texts = self.texts[layer]
+            for key in [key for key in texts if key not in keys]:
+                texts.pop(key).remove()
+
+    def _hide(self, layer, keep=()):
+        for key, text in self.texts[layer].items():
+            if key not in keep and text.get_visible():
+                text.set_visible(False)
+
+    def _update_texts(self, layer, keys, labels, positions, style):
+        # Текст создаётся только для подписей, которые сейчас видны;
+        # остальные прячутся, но не удаляются - пригодятся при приближении
+        texts = self.texts[layer]
+        keys = list(keys)
+        self._hide(layer, set(keys))
+
+        for key, label, (x, y) in zip(keys, labels, positions):
+            text = texts.get(key)
+            if text is None:
+                texts[key] = self.ax.text(
+                    x, y, label,
+                    family='sans-serif',
+                    horizontalalignment='center',
+                    verticalalignment='center',
+                    clip_on=True,
+                    animated=self.cached,
+                    **style
+                )
+                continue
+            if text.get_text() != label:
+                text.set_text(label)
+            if text.get_position() != (x, y):
+                text.set_position((x, y))
+            if not text.get_visible():
+                text.set_visible(True)
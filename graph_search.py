@@ -0,0 +1,346 @@
+import heapq
+from collections import OrderedDict
+from itertools import count
+
+import numpy as np
+
+
+def _number(value):
+    # Веса приходят и числами, и строками из DOT ('5', '"5"')
+    text = str(value).strip('"')
+    return float(text) if text else 0.0
+
+
+def node_heuristic(G, node):
+    # Вес узла A* - оценка расстояния до цели, у узла без веса 0
+    return _number(G.nodes[node].get('weight', 0))
+
+
+def weight_cost(weight):
+    cost = _number(weight)
+    if cost < 0:
+        raise ValueError('Отрицательный вес грани')
+    return cost
+
+
+def edge_cost(data):
+    return weight_cost(data['weight'])
+
+
+class SearchTree:
+    # Дерево поиска A* от одного источника. Эвристика - свойство узла, а не
+    # пары (узел, цель), поэтому очередь не зависит от цели: поиск можно
+    # остановить на одной цели и продолжить до следующей
+
+    def __init__(self, source):
+        self.source = source
+        # {узел: стоимость пути от source}
+        self.g = {source: 0.0}
+        self.pred = {source: None}
+        self.closed = set()
+        self._count = count()
+        self._heap = None
+
+    def advance(self, G, target):
+        if self._heap is None:
+            self._heap = [(node_heuristic(G, self.source), next(self._count), self.source)]
+
+        closed, heap = self.closed, self._heap
+        while target not in closed and heap:
+            _, _, node = heapq.heappop(heap)
+            if node in closed:
+                continue
+            closed.add(node)
+            g = self.g[node]
+            for neighbour, data in G.adj[node].items():
+                cost = g + edge_cost(data)
+                if cost < self.g.get(neighbour, float('inf')):
+                    self.g[neighbour] = cost
+                    self.pred[neighbour] = node
+                    # При несогласованной эвристике узел открывается заново
+                    closed.discard(neighbour)
+                    heapq.heappush(heap, (cost + node_heuristic(G, neighbour), next(self._count), neighbour))
+
+    def path(self, G, target):
+        self.advance(G, target)
+        if target not in self.closed:
+            return None, None
+        path = [target]
+        while self.pred[path[-1]] is not None:
+            path.append(self.pred[path[-1]])
+        return path[::-1], self.g[target]
+
+
+class PathCache:
+    # Деревья поиска по источникам, последние использованные в конце.
+    # Правка узла сбрасывает только те деревья, которые до него добрались
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._trees = OrderedDict()
+
+    def invalidate(self, nodes=None):
+        if nodes is None:
+            self._trees.clear()
+            return
+        for source, tree in list(self._trees.items()):
+            if any(node in tree.g for node in nodes):
+                del self._trees[source]
+
+    def path(self, G, source, target):
+        # -> (список узлов, стоимость) или (None, None), если пути нет
+        tree = self._trees.get(source)
+        if tree is None:
+            tree = self._trees[source] = SearchTree(source)
+            while len(self._trees) > self.maxsize:
+                self._trees.popitem(last=False)
+        self._trees.move_to_end(source)
+        try:
+            return tree.path(G, target)
+        except (KeyError, ValueError):
+            # Поиск оборвался посередине - дерево неполное, выбрасываем
+            del self._trees[source]
+            raise
+
+
+def _neighbours(G, node):
+    # Соседи в обе стороны: окрестность орграфа включает и входящие грани
+    if G.is_directed():
+        yield from G.succ[node]
+        yield from G.pred[node]
+    else:
+        yield from G.adj[node]
+
+
+def neighbourhood(G, focus, hops:int, budget:int):
+    # Узлы в пределах hops шагов от focus, не больше budget, ближние первыми.
+    # -> (подграф, граничные узлы): у граничных есть соседи за пределами
+    # подграфа, их можно раскрыть, сделав фокусом
+    nodes = {focus: None}
+    frontier = [focus]
+    for _ in range(hops):
+        next_frontier = []
+        for node in frontier:
+            for nbr in _neighbours(G, node):
+                if len(nodes) >= budget:
+                    break
+                if nbr not in nodes:
+                    nodes[nbr] = None
+                    next_frontier.append(nbr)
+        frontier = next_frontier
+        if len(nodes) >= budget:
+            break
+
+    H = G.__class__()
+    H.graph.update(G.graph)
+    H.add_nodes_from((node, G.nodes[node]) for node in nodes)
+    for u in nodes:
+        # У узлов с огромной степенью проверяются узлы подграфа, а не все соседи
+        nbrs = G.succ[u] if G.is_directed() else G.adj[u]
+        if len(nbrs) > len(nodes):
+            H.add_edges_from((u, v, nbrs[v]) for v in nodes if v in nbrs)
+        else:
+            H.add_edges_from((u, v, data) for v, data in nbrs.items() if v in nodes)
+    boundary = {node for node in nodes if any(nbr not in nodes for nbr in _neighbours(G, node))}
+    return H, boundary
+
+
+def weighted_snapshot(store):
+    # Снимок столбцов GraphStore для построения индекса в рабочем потоке:
+    # индексация массивов копирует, обхода графа в главном цикле нет
+    rows = store.node_rows()
+    edges = store.edge_rows()
+    return (
+        store.node_name[rows], store.node_name[store.edge_src[edges]], store.node_name[store.edge_dst[edges]],
+        store.edge_weight[edges], store.edge_has_weight[edges], store.directed
+    )
+
+
+def snapshot_adjacency(snapshot):
+    # weighted_snapshot -> {узел: {сосед: длина}}; собирается в рабочем потоке
+    names, src, dst, weights, has_weight, directed = snapshot
+    adj = {node: {} for node in names}
+    for u, v, weight, has in zip(src, dst, weights, has_weight):
+        if not has:
+            raise KeyError('weight')
+        cost = weight_cost(weight)
+        adj[u][v] = cost
+        if not directed:
+            adj[v][u] = cost
+    return adj
+
+
+def dijkstra_row(adj, index, source):
+    # Расстояния от source до всех узлов по порядку index, inf - недостижим
+    row = np.full(len(index), np.inf)
+    dist = {source: 0.0}
+    tie = count()
+    heap = [(0.0, next(tie), source)]
+    while heap:
+        d, _, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue
+        row[index[node]] = d
+        for nbr, cost in adj[node].items():
+            nd = d + cost
+            if nd < dist.get(nbr, np.inf):
+                dist[nbr] = nd
+                heapq.heappush(heap, (nd, next(tie), nbr))
+    return row
+
+
+class DistanceIndex:
+    # Расстояния между всеми парами узлов. Для небольших графов - полная
+    # матрица (Флойд-Уоршелл), для больших - строки по источникам, которые
+    # считаются Дейкстрой по запросу. Правки граней узла применяются к уже
+    # посчитанному: добавленная грань улучшает матрицу за O(n^2), а строки,
+    # в которых удалённая грань лежала на кратчайшем пути, пересчитываются
+
+    DENSE_LIMIT = 1000
+    ROWS = 256
+
+    def __init__(self, dense=None):
+        # Индекс пуст, пока load не задаст смежность: в рабочем потоке
+        # по snapshot_adjacency(weighted_snapshot(store))
+        self._dense = dense
+        self.matrix = None
+        # {источник: строка расстояний}, последние использованные в конце
+        self._rows = OrderedDict()
+        self.load({}, False)
+
+    def load(self, adj, directed):
+        self.directed = directed
+        self.adj = adj
+        self.nodes = list(self.adj)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.dense = len(self.nodes) <= self.DENSE_LIMIT if self._dense is None else self._dense
+        self.matrix = None
+        self._rows.clear()
+        return self
+
+    def build(self, cancelled=None):
+        if not self.dense:
+            return self
+        n = len(self.nodes)
+        matrix = np.full((n, n), np.inf)
+        np.fill_diagonal(matrix, 0.0)
+        for node, nbrs in self.adj.items():
+            i = self.index[node]
+            for nbr, cost in nbrs.items():
+                j = self.index[nbr]
+                matrix[i, j] = min(matrix[i, j], cost)
+        for k in range(n):
+            if cancelled is not None and k % 64 == 0 and cancelled():
+                return None
+            np.minimum(matrix, matrix[:, k, None] + matrix[None, k, :], out=matrix)
+        self.matrix = matrix
+        return self
+
+    def row(self, source):
+        i = self.index[source]
+        if self.dense:
+            return self.matrix[i]
+        row = self._rows.get(source)
+        if row is None:
+            row = self._rows[source] = dijkstra_row(self.adj, self.index, source)
+            if len(self._rows) > self.ROWS:
+                self._rows.popitem(last=False)
+        self._rows.move_to_end(source)
+        return row
+
+    def distances(self, source, limit=None):
+        # [(узел, расстояние)] по возрастанию, без недостижимых и самого source
+        row = self.row(source)
+        order = np.argsort(row, kind='stable')
+        result = []
+        for i in order:
+            if not np.isfinite(row[i]):
+                break
+            if self.nodes[i] != source:
+                result.append((self.nodes[i], float(row[i])))
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    def set_node_edges(self, node, edges:dict):
+        # Новые грани узла {сосед: длина}; у орграфа - исходящие
+        for nbr in (node, *edges):
+            if nbr not in self.index:
+                self._add_node(nbr)
+        old = self.adj[node]
+        removed = [(node, nbr, cost) for nbr, cost in old.items() if edges.get(nbr, np.inf) > cost]
+        added = [(node, nbr, cost) for nbr, cost in edges.items() if cost < old.get(nbr, np.inf)]
+        for nbr in list(old):
+            if nbr not in edges:
+                self.adj[node].pop(nbr, None)
+                if not self.directed:
+                    self.adj[nbr].pop(node, None)
+        for nbr, cost in edges.items():
+            self.adj[node][nbr] = cost
+            if not self.directed:
+                self.adj[nbr][node] = cost
+        self._apply(removed, added)
+
+    def remove_node(self, node):
+        if node not in self.index:
+            return
+        removed = [(node, nbr, cost) for nbr, cost in self.adj[node].items()]
+        if self.directed:
+            removed += [(src, node, nbrs[node]) for src, nbrs in self.adj.items() if node in nbrs]
+        for src, dst, _ in removed:
+            self.adj[src].pop(dst, None)
+            if not self.directed:
+                self.adj[dst].pop(src, None)
+        self._apply(removed, [])
+
+        i = self.index.pop(node)
+        del self.adj[node]
+        del self.nodes[i]
+        self.index = {name: j for j, name in enumerate(self.nodes)}
+        self._rows.pop(node, None)
+        if self.dense:
+            self.matrix = np.delete(np.delete(self.matrix, i, axis=0), i, axis=1)
+        for source, row in self._rows.items():
+            self._rows[source] = np.delete(row, i)
+
+    def _add_node(self, node):
+        self.index[node] = len(self.nodes)
+        self.nodes.append(node)
+        self.adj[node] = {}
+        if self.dense:
+            n = len(self.nodes)
+            matrix = np.full((n, n), np.inf)
+            matrix[:-1, :-1] = self.matrix
+            matrix[-1, -1] = 0.0
+            self.matrix = matrix
+        for source, row in self._rows.items():
+            self._rows[source] = np.append(row, np.inf)
+
+    def _arcs(self, edges):
+        # Грани неориентированного графа работают в обе стороны
+        for u, v, cost in edges:
+            yield self.index[u], self.index[v], cost
+            if not self.directed:
+                yield self.index[v], self.index[u], cost
+
+    def _apply(self, removed, added):
+        if self.dense:
+            # Строки, где удалённая грань была на кратчайшем пути
+            affected = set()
+            for i, j, cost in self._arcs(removed):
+                affected.update(np.flatnonzero(self.matrix[:, i] + cost == self.matrix[:, j]))
+            for s in affected:
+                self.matrix[s] = dijkstra_row(self.adj, self.index, self.nodes[s])
+            if affected and not self.directed:
+                rows = sorted(affected)
+                self.matrix[:, rows] = self.matrix[rows].T
+            for i, j, cost in self._arcs(added):
+                np.minimum(self.matrix, self.matrix[:, i, None] + cost + self.matrix[None, j, :], out=self.matrix)
+            return
+
+        # Строки по запросу: устаревшие просто выбрасываются
+        for source, row in list(self._rows.items()):
+            stale = any(row[i] + cost == row[j] for i, j, cost in self._arcs(removed)) or \
+                any(row[i] + cost < row[j] for i, j, cost in self._arcs(added))
+            if stale:
+                del self._rows[source]
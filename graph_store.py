@@ -0,0 +1,212 @@
+import numpy as np
+
+from graph_colors import EDGE_RGBA, NODE_RGBA
+
+
+def _label(data, attr):
+    if attr in data:
+        # Кавычки DOT снимает чтение, оставшиеся - часть значения
+        return str(data[attr])
+    return ''
+
+
+class GraphStore:
+    # Столбцы атрибутов рядом с графом networkx. Строка узла или грани
+    # выдаётся один раз и не переиспользуется, удалённые строки только
+    # помечаются; при большом числе дыр хранилище уплотняется, и тогда
+    # растёт epoch - номера строк после этого другие
+
+    NODE_COLUMNS = {
+        'node_name': object,
+        'node_label': object,
+        'node_weight': object,
+        'node_desc': object,
+        'node_color': np.uint32,
+        'node_alive': bool,
+    }
+    EDGE_COLUMNS = {
+        'edge_key': object,
+        'edge_src': np.intp,
+        'edge_dst': np.intp,
+        'edge_weight': object,
+        'edge_color': np.uint32,
+        'edge_has_weight': bool,
+        'edge_alive': bool,
+    }
+
+    def __init__(self, directed=False):
+        self.directed = directed
+        self.epoch = 0
+        self._reset()
+
+    def _reset(self):
+        self.n_rows = 0
+        self.m_rows = 0
+        for name, dtype in {**self.NODE_COLUMNS, **self.EDGE_COLUMNS}.items():
+            setattr(self, name, np.zeros(16, dtype=dtype))
+        self.node_index = {}
+        self.edge_index = {}
+        # {строка узла: {строки граней}}
+        self.node_edges = {}
+        self.missing_weight = 0
+        self._node_rows = None
+        self._edge_rows = None
+
+    @classmethod
+    def from_graph(cls, G):
+        store = cls(G.is_directed())
+        for node, data in G.nodes(data=True):
+            store.set_node(node, data)
+        for u, v, data in G.edges(data=True):
+            store.set_edge(u, v, data)
+        return store
+
+    def _grow(self, columns, size):
+        for name in columns:
+            column = getattr(self, name)
+            if len(column) < size:
+                grown = np.zeros(max(size, 2 * len(column)), dtype=column.dtype)
+                grown[:len(column)] = column
+                setattr(self, name, grown)
+
+    def key_of(self, u, v):
+        if self.directed or u <= v:
+            return (u, v)
+        return (v, u)
+
+    def node_rows(self):
+        if self._node_rows is None:
+            self._node_rows = np.flatnonzero(self.node_alive[:self.n_rows])
+        return self._node_rows
+
+    def edge_rows(self):
+        if self._edge_rows is None:
+            self._edge_rows = np.flatnonzero(self.edge_alive[:self.m_rows])
+        return self._edge_rows
+
+    def __len__(self):
+        return len(self.node_index)
+
+    def set_node(self, name, data=None):
+        data = data or {}
+        row = self.node_index.get(name)
+        if row is None:
+            row = self.n_rows
+            self._grow(self.NODE_COLUMNS, row + 1)
+            self.n_rows += 1
+            self.node_index[name] = row
+            self.node_edges[row] = set()
+            self.node_name[row] = name
+            self.node_label[row] = str(name) + '\n\n\n\n'
+            self.node_alive[row] = True
+            self._node_rows = None
+        self.node_weight[row] = _label(data, 'weight')
+        self.node_desc[row] = _label(data, 'description')
+        self.node_color[row] = data.get('fillcolor', NODE_RGBA)
+        return row
+
+    def remove_node(self, name):
+        row = self.node_index.pop(name)
+        for edge_row in list(self.node_edges[row]):
+            self._remove_edge_row(edge_row)
+        del self.node_edges[row]
+        self.node_alive[row] = False
+        self._node_rows = None
+        self._maybe_compact()
+
+    def set_edge(self, u, v, data=None):
+        data = data or {}
+        key = self.key_of(u, v)
+        row = self.edge_index.get(key)
+        if row is None:
+            src = self.node_index.get(u)
+            if src is None:
+                src = self.set_node(u)
+            dst = self.node_index.get(v)
+            if dst is None:
+                dst = self.set_node(v)
+
+            row = self.m_rows
+            self._grow(self.EDGE_COLUMNS, row + 1)
+            self.m_rows += 1
+            self.edge_index[key] = row
+            self.edge_key[row] = (u, v)
+            self.edge_src[row] = src
+            self.edge_dst[row] = dst
+            self.edge_alive[row] = True
+            self.edge_has_weight[row] = True
+            self.node_edges[src].add(row)
+            self.node_edges[dst].add(row)
+            self._edge_rows = None
+
+        has_weight = 'weight' in data
+        if has_weight != self.edge_has_weight[row]:
+            self.missing_weight += -1 if has_weight else 1
+            self.edge_has_weight[row] = has_weight
+        self.edge_weight[row] = str(data['weight']) if has_weight else ''
+        self.edge_color[row] = data.get('fillcolor', EDGE_RGBA)
+        return row
+
+    def remove_edge(self, u, v):
+        self._remove_edge_row(self.edge_index[self.key_of(u, v)])
+        self._maybe_compact()
+
+    def apply_edit(self, G, edit):
+        # Правка graph_edit.Edit, уже применённая к G, повторяется в столбцах:
+        # атрибуты берутся из G, узлы удаляются после граней, как в apply_edit
+        for node, (_, after) in edit.nodes.items():
+            if after is not None:
+                self.set_node(node, G.nodes[node])
+        for (u, v), (_, after) in edit.edges.items():
+            if after is None:
+                self.remove_edge(u, v)
+            else:
+                self.set_edge(u, v, G.edges[u, v])
+        for node, (_, after) in edit.nodes.items():
+            if after is None:
+                self.remove_node(node)
+
+    def _remove_edge_row(self, row):
+        u, v = self.edge_key[row]
+        del self.edge_index[self.key_of(u, v)]
+        self.node_edges[self.edge_src[row]].discard(row)
+        self.node_edges[self.edge_dst[row]].discard(row)
+        if not self.edge_has_weight[row]:
+            self.missing_weight -= 1
+        self.edge_alive[row] = False
+        self._edge_rows = None
+
+    def _maybe_compact(self):
+        # Уплотнение, когда мёртвых строк больше половины
+        if self.n_rows > 64 and len(self.node_index) * 2 < self.n_rows or \
+                self.m_rows > 64 and len(self.edge_index) * 2 < self.m_rows:
+            self.compact()
+
+    def compact(self):
+        node_rows = self.node_rows()
+        edge_rows = self.edge_rows()
+        nodes = {name: getattr(self, name)[node_rows] for name in self.NODE_COLUMNS}
+        edges = {name: getattr(self, name)[edge_rows] for name in self.EDGE_COLUMNS}
+        renumber = np.full(self.n_rows, -1, dtype=np.intp)
+        renumber[node_rows] = np.arange(len(node_rows))
+
+        self._reset()
+        self.epoch += 1
+        self.n_rows = len(node_rows)
+        self.m_rows = len(edge_rows)
+        self._grow(self.NODE_COLUMNS, self.n_rows)
+        self._grow(self.EDGE_COLUMNS, self.m_rows)
+        for name, column in nodes.items():
+            getattr(self, name)[:self.n_rows] = column
+        for name, column in edges.items():
+            getattr(self, name)[:self.m_rows] = column
+        self.edge_src[:self.m_rows] = renumber[edges['edge_src']]
+        self.edge_dst[:self.m_rows] = renumber[edges['edge_dst']]
+
+        self.node_index = {name: row for row, name in enumerate(nodes['node_name'])}
+        self.node_edges = {row: set() for row in range(self.n_rows)}
+        for row, (u, v) in enumerate(edges['edge_key']):
+            self.edge_index[self.key_of(u, v)] = row
+            self.node_edges[self.edge_src[row]].add(row)
+            self.node_edges[self.edge_dst[row]].add(row)
+        self.missing_weight = int((~edges['edge_has_weight']).sum())
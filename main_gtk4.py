@@ -1,32 +1,277 @@
+import os
+import queue
 import sys
+import threading
+import time
+# Отсчёт запуска: от начала импорта модуля окна до первой отрисовки холста
+STARTED = time.perf_counter()
 import networkx as nx
 
 import gi
 gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
 gi.require_version('Gdk', '4.0')
-from gi.repository import Gtk, Gdk, Adw
+from gi.repository import Gtk, Gdk, Adw, Gio, GLib, GObject
+
+from graph_analytics import Analytics, CSRGraph, degree_bins, store_snapshot
+from graph_autosave import Autosave
+from graph_colors import EDGE_RGBA, NODE_COLOR, pack_floats, rgba2hex
+from graph_edit import Edit, Journal, apply_edit, node_edit, rebase_edit, remove_edit
+from graph_index import NamePrefixIndex, SpatialIndex
+from graph_io import read_graph, write_dot, write_graph_bin
+from graph_layout import LAYOUT_ENGINES, LayoutCache
+from graph_profile import profiler, span, timed
+from graph_search import (
+    DistanceIndex, PathCache, edge_cost, neighbourhood, snapshot_adjacency, weighted_snapshot
+)
+from graph_store import GraphStore
+# matplotlib и холст GTK импортируются в create_canvas, когда окно уже на экране
+
+IMPORTED = time.perf_counter()
+
+
+class EdgeRow(GObject.Object):
+    # Грань выбранного узла в списке панели, значения как в полях ввода
+    def __init__(self, target='', weight='', color=EDGE_RGBA):
+        super().__init__()
+        self.target = target
+        self.weight = weight
+        self.color = color
+
+
+class EdgeRowBox(Gtk.Box):
+    # Виджеты одной строки списка граней. Gtk.ListView создаёт их только на
+    # видимые строки и при прокрутке подставляет в них другие грани
+    def __init__(self, window):
+        super().__init__(orientation=Gtk.Orientation.HORIZONTAL, spacing=5)
+        self.window = window
+        self.item = None
+
+        self.entry_target = Gtk.Entry(
+            placeholder_text='Назначение',
+            tooltip_text='Имя узла-назначения',
+            hexpand=True,
+            width_chars=12
+        )
+        self.entry_target.connect('activate', window.update_node)
+        self.entry_target.connect('changed', self.target_changed)
+        self.append(self.entry_target)
+        self.append(Gtk.Label(label=':'))
+
+        self.entry_weight = Gtk.Entry(
+            placeholder_text='Расстояние',
+            tooltip_text='Расстояние до назначения',
+            width_chars=7
+        )
+        self.entry_weight.connect('activate', window.update_node)
+        self.entry_weight.connect('changed', self.weight_changed)
+        self.entry_weight.set_visible(window.switch_edges.get_active())
+        self.append(self.entry_weight)
+
+        self.button_color = Gtk.ColorButton(
+            height_request=32,
+            tooltip_text='Цвет узла'
+        )
+        self.button_color.connect('color-set', self.color_set)
+        self.append(self.button_color)
+
+        button_rm = Gtk.Button(
+            width_request=32,
+            height_request=32,
+            icon_name='edit-delete',
+            tooltip_text='Удалить выбранную грань'
+        )
+        button_rm.connect('clicked', self.remove_clicked)
+        self.append(button_rm)
+
+    def bind(self, item):
+        # Пока поля заполняются, правки в грань не пишутся
+        self.item = None
+        self.entry_target.set_text(item.target)
+        self.entry_weight.set_text(item.weight)
+        self.window.set_color_to_button(self.button_color, color_hex=rgba2hex(item.color))
+        self.item = item
+
+    def unbind(self):
+        self.item = None
+
+    def target_changed(self, entry):
+        if self.item is not None:
+            self.item.target = entry.get_text()
+
+    def weight_changed(self, entry):
+        if self.item is not None:
+            self.item.weight = entry.get_text()
+
+    def color_set(self, button):
+        if self.item is not None:
+            self.item.color = self.window.rgba_from_button(button)
+            self.window.update_node()
+
+    def remove_clicked(self, button):
+        if self.item is not None:
+            self.window.remove_edge_row(self.item)
 
-from matplotlib.backends.backend_gtk4cairo import FigureCanvas
-from matplotlib.figure import Figure
 
 class MainWindow(Gtk.ApplicationWindow):
+    # Сколько ближайших узлов показывать в панели расстояний
+    DISTANCE_LIMIT = 10
+    # Подсказки имён узлов и задержка чтения узла при наборе имени, мс
+    COMPLETION_LIMIT = 10
+    CHECK_DELAY = 150
+    # Сколько ждать после последнего сдвига или масштаба до пересчёта детализации, мс
+    SETTLE_DELAY = 200
+    # Период обновления замеров поверх холста, мс
+    PROFILE_PERIOD = 500
+    # Аналитика считается, когда граф не меняется ANALYTICS_DELAY мс;
+    # в панели - первые ANALYTICS_TOP узлов по каждой метрике
+    ANALYTICS_DELAY = 500
+    ANALYTICS_TOP = 5
+    ANALYTICS_METRICS = [
+        ('degree', 'Степень'),
+        ('component', 'Компонента'),
+        ('pagerank', 'PageRank'),
+        ('betweenness', 'Посредничество'),
+    ]
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-
-        self.fig = Figure(figsize=(6, 4), constrained_layout=True)
-        self.fig.canvas.mpl_connect('button_press_event', self.choose_node)
-        self.ax = self.fig.add_subplot()
+        started = time.perf_counter()
+        profiler.record('startup.import', STARTED, IMPORTED - STARTED)
+
+        # Фигура, холст и renderer появляются в create_canvas после первого кадра
+        self.fig = None
+        self.ax = None
+        self.renderer = None
+        self.canvas = None
+        self.first_paint_id = None
+        # Сдвиг холста правой или средней кнопкой: точка нажатия и пределы осей
+        self.pan_start = None
+        self.settle_timeout = None
 
         self.G = nx.Graph()
+        # Атрибуты узлов и граней по столбцам, обновляется вместе с G
+        self.store = GraphStore()
+        self.layout_cache = LayoutCache()
+        self.pos = {}
+        # Режим окрестности: рисуется только подграф в пределах нескольких
+        # шагов от узла-фокуса, со своим хранилищем и кэшем раскладок по фокусам
+        self.focus_center = None
+        self.focus_graph = None
+        self.focus_store = None
+        self.focus_boundary = set()
+        self.focus_layouts = LayoutCache(maxsize=64)
+        self.node_index = None
+        # Имена узлов для подсказок; check_node читает узел с задержкой
+        self.name_index = NamePrefixIndex()
+        self.check_timeout = None
+        # Ревизия графа растёт с каждой правкой, structure_revision - только
+        # когда появляются или исчезают узлы и грани
+        self.revision = 0
+        self.structure_revision = 0
+        self.layout_job = None
+        self.load_token = None
+        # Журнал правок для отмены и повтора
+        self.journal = Journal()
+        # Поиск пути: деревья поиска по источникам, выбранные начало и цель
+        self.path_cache = PathCache()
+        self.path_source = None
+        self.path_target = None
+        # Индекс расстояний между всеми узлами. Построение и правки индекса
+        # выполняются по очереди в одном рабочем потоке; читать его можно,
+        # только когда очередь пуста
+        self.distance_index = None
+        self.distance_ops = queue.Queue()
+        self.distance_pending = 0
+        threading.Thread(target=self.run_distance_ops, daemon=True).start()
+        # Аналитика графа: результат по structure_revision, расчёт в рабочем
+        # потоке; новый токен прерывает расчёт по устаревшему снимку
+        self.analytics = None
+        self.analytics_token = None
+        self.analytics_timeout = None
         
         self.english_letters = 'abcdefghijklmnopqrstuvwxyz1234567890'
 
-        # [[Gtk.Box, Gtk.Entry_Name, Gtk.Entry_Weight, Gtk.ColorButton]]
-        self.gui_edges = []
+        # Грани выбранного узла и виджеты строк, созданные списком
+        self.edge_rows = Gio.ListStore(item_type=EdgeRow)
+        self.edge_row_boxes = []
+
+        # Отложенная перерисовка: накопленные части и id обратного вызова кадра
+        self.dirty = set()
+        self.redraw_tick = None
+        # Обновление замеров поверх холста, пока включено профилирование
+        self.profile_timeout = None
 
         self.build_main_window()
-        self.redraw()
+        self.queue_redraw()
+        profiler.record('startup.window', started, time.perf_counter() - started)
+
+        # Автосохранение правок; граф после сбоя восстанавливается через load_done.
+        # У каждого окна своя папка: номер - наименьший свободный среди открытых
+        # окон, так что после сбоя окна снова разбирают журналы по тем же номерам
+        app = self.get_application()
+        self.autosave_slot = min(set(range(len(app.autosave_slots) + 1)) - app.autosave_slots)
+        app.autosave_slots.add(self.autosave_slot)
+        # Выход по GRAPH_STARTUP_BUDGET оставляет журнал, как при сбое
+        self.keep_autosave = False
+        # Правки окна, пока поток автосохранения ищет граф после сбоя;
+        # None - поиск закончен или граф окна заменён целиком
+        self.recovery_edits = []
+        self.autosave = Autosave(
+            os.path.join(GLib.get_user_state_dir(), app.get_application_id(), 'autosave', str(self.autosave_slot)),
+            self.G.copy(),
+            on_recovered=self.autosave_recovered,
+            on_error=lambda error: GLib.idle_add(self.autosave_failed)
+        )
+        self.connect('close-request', self.window_closed)
+        # Приоритет ниже перерисовки GTK: сначала окно показывается пустым
+        GLib.idle_add(self.create_canvas, priority=GLib.PRIORITY_LOW)
+
+    def create_canvas(self):
+        started = time.perf_counter()
+        from matplotlib.backends.backend_gtk4cairo import FigureCanvas
+        from graph_render import GraphFigure, GraphRenderer
+
+        self.fig = GraphFigure(figsize=(6, 4), constrained_layout=True)
+        self.fig.canvas.mpl_connect('button_press_event', self.press_canvas)
+        self.fig.canvas.mpl_connect('motion_notify_event', self.pan_canvas)
+        self.fig.canvas.mpl_connect('button_release_event', self.release_canvas)
+        self.fig.canvas.mpl_connect('scroll_event', self.zoom_canvas)
+        self.fig.canvas.mpl_connect('resize_event', lambda event: self.queue_redraw('view'))
+        self.first_paint_id = self.fig.canvas.mpl_connect('draw_event', self.first_paint)
+        self.ax = self.fig.add_subplot()
+        self.renderer = GraphRenderer(self.ax, cached=True)
+
+        self.canvas = FigureCanvas(self.fig)
+        self.canvas.set_hexpand(True)
+        self.canvas.set_vexpand(True)
+        self.canvas.set_size_request(400, 400)
+        self.canvas_overlay.set_child(self.canvas)
+        profiler.record('startup.canvas', started, time.perf_counter() - started)
+
+        # Выбор и путь, сделанные до появления холста
+        node_name = self.entry_node_name.get_text().strip()
+        self.renderer.set_focus(node_name if node_name in self.G else None)
+        self.find_path()
+        if self.dirty:
+            self.redraw_tick = self.canvas.add_tick_callback(self.on_redraw_tick)
+        return GLib.SOURCE_REMOVE
+
+    def first_paint(self, event):
+        self.fig.canvas.mpl_disconnect(self.first_paint_id)
+        elapsed = time.perf_counter() - STARTED
+        profiler.record('startup.paint', STARTED, elapsed)
+
+        # GRAPH_STARTUP_BUDGET=мс: вывести время запуска и выйти,
+        # код возврата 1 при превышении бюджета
+        budget = os.environ.get('GRAPH_STARTUP_BUDGET')
+        if budget:
+            for name, last, _ in profiler.summary():
+                if name.startswith('startup.'):
+                    print(f'{name:<16} {last * 1000:8.1f} мс', file=sys.stderr)
+            self.get_application().over_budget = elapsed * 1000 > float(budget)
+            self.keep_autosave = True
+            GLib.idle_add(self.close)
 
     def all_clear(self):
         self.entry_node_name.set_text('')
@@ -34,141 +279,253 @@ class MainWindow(Gtk.ApplicationWindow):
         self.entry_node_desc.set_text('')
         self.box_edges_clear()
         self.set_color_to_button(self.button_color)
+        self.label_distances.set_text('')
+        if self.renderer is not None:
+            self.renderer.set_focus(None)
+        self.queue_redraw('view')
+
+    def graph_changed(self, nodes=None, layout=True):
+        # Граф изменился: новая ревизия. nodes=None - граф заменён целиком,
+        # layout=False - поменялись только атрибуты, раскладка прежняя
+        self.revision += 1
+        if nodes is None or layout:
+            self.structure_revision += 1
+            self.schedule_analytics()
+        if nodes is None:
+            self.name_index = NamePrefixIndex(self.G)
+            self.layout_cache.invalidate()
+            self.focus_layouts.clear()
+            self.path_cache.invalidate()
+            self.journal.clear()
+            self.update_undo_buttons()
+            self.start_distance_index()
+        elif layout:
+            self.layout_cache.invalidate(nodes)
+        self.find_path()
+        if self.switch_focus.get_active():
+            # Подграф окрестности собирается заново: у него свои строки и цвета
+            self.update_focus()
+            self.queue_redraw()
+        elif layout:
+            self.queue_redraw()
+        else:
+            self.queue_redraw('style', 'labels')
+
+    def layout_source(self):
+        # (кэш раскладок, граф, хранилище), которые сейчас на холсте
+        if self.focus_graph is not None:
+            return self.focus_layouts, self.focus_graph, self.focus_store
+        return self.layout_cache, self.G, self.store
+
+    def update_focus(self):
+        # Без выбранного узла фокусом становится первый узел графа
+        self.focus_graph = self.focus_store = None
+        self.focus_boundary = set()
+        if self.switch_focus.get_active() and len(self.G):
+            if self.focus_center not in self.G:
+                self.focus_center = next(iter(self.G))
+            with span('focus.neighbourhood'):
+                self.focus_graph, self.focus_boundary = neighbourhood(
+                    self.G, self.focus_center,
+                    self.spin_focus_hops.get_value_as_int(),
+                    self.spin_focus_budget.get_value_as_int()
+                )
+                self.focus_store = GraphStore.from_graph(self.focus_graph)
+            self.label_focus.set_text(
+                f'{self.focus_center}: узлов {len(self.focus_graph)} из {len(self.G)}, '
+                f'граничных {len(self.focus_boundary)}'
+            )
+        # Раскладка ищется по структуре подграфа, уже виденный фокус берётся из кэша
+        self.focus_layouts.invalidate()
+
+    def focus_changed(self):
+        # Новая ревизия: раскладка прежнего фокуса, если ещё считается, не попадёт на холст
+        self.revision += 1
+        self.update_focus()
+        self.queue_redraw()
+
+    def switch_change_focus(self, widget, is_activated):
+        self.box_focus.set_visible(is_activated)
+        self.label_focus.set_visible(is_activated)
+        self.focus_changed()
+
+    def focus_settings_changed(self, spin):
+        if self.switch_focus.get_active():
+            self.focus_changed()
+
+    @timed('edit.commit')
+    def commit_edit(self, edit):
+        # Применение правки к графу и точечный сброс зависящих от неё кэшей
+        apply_edit(self.G, edit)
+        self.store.apply_edit(self.G, edit)
+        for node, (before, after) in edit.nodes.items():
+            if after is None:
+                self.name_index.remove(node)
+            elif before is None:
+                self.name_index.add(node)
+
+        self.autosave.record(edit)
+        if self.recovery_edits is not None:
+            self.recovery_edits.append(edit)
+        if edit.structural():
+            # Отпечаток графа для кэша раскладок - по самой правке, без обхода графа
+            self.layout_cache.edited(edit)
+        # Поиск пути и расстояния зависят только от весов
+        self.path_cache.invalidate(edit.weighted())
+        if self.distance_index is not None:
+            self.update_distance_index(edit)
+        self.graph_changed(edit.touched(), layout=edit.structural())
+
+    def undo(self, *args):
+        if not self.journal.can_undo():
+            return True
+        self.commit_edit(self.journal.undo())
+        self.edit_replayed()
+        return True
 
-    def redraw(self, button=None):
-        self.label_error.hide()
-        self.ax.clear()
-        self.pos = nx.nx_pydot.pydot_layout(self.G)
-
-        xmas = []
-        ymas = []
-        if self.pos:
-            for key in self.pos:
-                x, y = self.pos[key]
-                xmas.append(x)
-                ymas.append(y)
-                self.xr = max(xmas) - min(xmas)
-                self.yr = max(ymas) - min(ymas)
-
-        node_name_labels = {}
-        node_color_map = []
-        weight_labels = {}
-        desc_labels = {}
-        for node in self.G.nodes(data=True):
-            node_name_labels.update({node[0]: node[0] + '\n\n\n\n'})
-
-            try:
-                hex_color = self.rgb2hex(node[1]['fillcolor'])
-            except KeyError:
-                hex_color = '#9a9996'
-            finally:
-                node_color_map.append(hex_color)
+    def redo(self, *args):
+        if not self.journal.can_redo():
+            return True
+        self.commit_edit(self.journal.redo())
+        self.edit_replayed()
+        return True
 
-            try:
-                desc = str(node[1]['description']).strip('"')
-            except KeyError:
-                pass
-            else:
-                if desc:
-                    desc_labels.update({node[0]: desc}) 
+    def edit_replayed(self):
+        # Панель узла показывает состояние после отмены или повтора
+        self.update_undo_buttons()
+        node_name = self.entry_node_name.get_text().strip()
+        if node_name in self.G:
+            self.read_node(node_name, change=False)
+        else:
+            self.all_clear()
 
-            try:
-                weight = str(node[1]['weight']).strip('"')
-            except KeyError:
-                pass
-            else:
-                if weight:
-                    weight_labels.update({node[0]: '\n\n\n\n' + weight}) 
+    def update_undo_buttons(self):
+        self.button_undo.set_sensitive(self.journal.can_undo())
+        self.button_redo.set_sensitive(self.journal.can_redo())
+
+    def queue_redraw(self, *parts):
+        # Запросы перерисовки копятся до следующего кадра и выполняются разом.
+        # parts: 'layout' - раскладка, 'style' - цвета, 'labels' - подписи,
+        # 'view' - только масштаб и детализация, их renderer.draw() проверяет сам,
+        # 'navigate' - сдвиг или масштаб без пересчёта, по готовым снимкам слоёв
+        self.dirty.update(parts or ('layout', 'style', 'labels'))
+        if self.redraw_tick is None and self.canvas is not None:
+            self.redraw_tick = self.canvas.add_tick_callback(self.on_redraw_tick)
+
+    def on_redraw_tick(self, widget, frame_clock):
+        self.redraw_tick = None
+        parts, self.dirty = self.dirty, set()
+        self.redraw(parts)
+        return GLib.SOURCE_REMOVE
+
+    @timed('redraw')
+    def redraw(self, parts=None):
+        parts = set(parts or ('layout', 'style', 'labels'))
+        if parts == {'navigate'}:
+            self.renderer.navigate()
+            # Детализация пересчитывается, когда вид перестал меняться
+            if self.settle_timeout is not None:
+                GLib.source_remove(self.settle_timeout)
+            self.settle_timeout = GLib.timeout_add(self.SETTLE_DELAY, self.navigation_settled)
+            return
+        self.label_error.hide()
 
-        edge_labels = {}
-        edge_color_map = []
-        for edge in self.G.edges(data=True):
-            if 'weight' not in edge[2]:
+        if 'layout' in parts:
+            if self.store.missing_weight:
                 self.label_error.set_label('Ошибка в файле')
                 self.label_error.show()
                 return
-            if 'fillcolor' in edge[2]:
-                hex_color = self.rgb2hex(edge[2]['fillcolor'])
-            else:
-                hex_color = '#000000'
-            edge_color_map.append(hex_color)
-            edge_labels.update({(edge[0], edge[1]): str(edge[2]['weight'])})
-
-        # Отрисовка обводки узлов
-        nx.draw_networkx_nodes(
-            self.G,
-            self.pos,
-            ax=self.ax,
-            alpha=0.55,
-            node_color='#000000',
-            node_size=750
-        )
-
-        # Отрисовка узлов
-        nx.draw_networkx_nodes(
-            self.G,
-            self.pos,
-            ax=self.ax,
-            node_color=node_color_map,
-            node_size=600
-        )
-
-        # Отрисовка граней
-        nx.draw_networkx_edges(
-            self.G,
-            self.pos,
-            ax=self.ax,
-            alpha=0.55,
-            width=1.5,
-            edge_color=edge_color_map
-        )
-
-        # Отрисовка имён узлов
-        nx.draw_networkx_labels(
-            self.G,
-            self.pos,
-            node_name_labels,
-            ax=self.ax
-        )
-
-        # Отрисовка весов граней
-        if self.switch_edges.get_active():
-            nx.draw_networkx_edge_labels(
-                self.G,
-                self.pos,
-                edge_labels=edge_labels,
-                label_pos=self.w_scale.get_value() / 10,
-                rotate=False,
-                ax=self.ax
-            )
 
-        # Отрисовка весов узлов
-        if self.switch_astar.get_active():
-            nx.draw_networkx_labels(
-                self.G,
-                self.pos,
-                weight_labels,
-                ax=self.ax,
-                font_color='#ff0000'
-            )
+            cache, graph, store = self.layout_source()
+            with span('layout.lookup'):
+                key, pos = cache.lookup(graph)
+            if pos is None:
+                # Пока раскладка считается, на холсте остаётся старая картинка
+                self.dirty.update(parts)
+                self.start_layout(key)
+                return
 
-        # Отрисовка подписей
-        if self.switch_desc.get_active():
-            nx.draw_networkx_labels(
-                self.G,
-                self.pos,
-                desc_labels,
-                ax=self.ax,
-                font_color='#ffffff',
-                bbox={'boxstyle': 'square', 'color': '#000000', 'alpha': 0.2}
+            self.pos = pos
+            self.renderer.set_geometry(store, self.pos)
+            self.renderer.set_boundary(self.focus_boundary)
+            # Новые художники узлов и граней нужно перекрасить и подписать
+            parts.update(('style', 'labels'))
+
+        if 'style' in parts:
+            self.renderer.set_style(self.revision)
+
+        if 'labels' in parts:
+            self.renderer.set_labels(
+                show_edges=self.switch_edges.get_active(),
+                show_astar=self.switch_astar.get_active(),
+                show_desc=self.switch_desc.get_active(),
+                label_pos=self.w_scale.get_value() / 10
             )
 
-        self.fig.canvas.draw()
+        self.renderer.draw()
+
+    def start_layout(self, key):
+        cache, graph, _ = self.layout_source()
+        job = self.layout_job
+        if job is not None:
+            # Правка без смены структуры не отменяет уже идущую раскладку.
+            # Ключ сверяется вместе с кэшем: подграф фокуса, совпавший со всем
+            # графом, даёт тот же ключ, но раскладка нужна другому кэшу
+            if job.key == key and job.cache is cache:
+                job.revision = self.revision
+                return
+            job.cancel()
+
+        job = cache.request(graph, key)
+        job.cache = cache
+        job.revision = self.revision
+        self.layout_job = job
+        self.spinner_layout.start()
+        threading.Thread(target=self.run_layout_job, args=(job,), daemon=True).start()
+
+    def run_layout_job(self, job):
+        # Выполняется в рабочем потоке, результат передаётся в главный цикл
+        try:
+            with span('layout.run'):
+                pos = job.run()
+        except Exception:
+            GLib.idle_add(self.layout_failed, job)
+        else:
+            GLib.idle_add(self.layout_done, job, pos)
+
+    def layout_done(self, job, pos):
+        if pos is not None:
+            if job is self.layout_job and job.revision == self.revision:
+                job.cache.store(job.key, pos)
+                self.queue_redraw('layout')
+            else:
+                # Устаревшая раскладка ещё пригодится, если граф вернётся к ней
+                job.cache.remember(job.key, pos)
+        if job is self.layout_job:
+            self.layout_job = None
+            self.spinner_layout.stop()
+        return GLib.SOURCE_REMOVE
+
+    def layout_failed(self, job):
+        if job is self.layout_job:
+            self.layout_job = None
+            self.spinner_layout.stop()
+            self.label_error.set_label('Ошибка раскладки графа')
+            self.label_error.show()
+        return GLib.SOURCE_REMOVE
 
     def read_node(self, node_name, change=True):
         self.label_error.hide()
         if change:
             self.entry_node_name.set_text(node_name)
+        if self.renderer is not None:
+            self.renderer.set_focus(node_name)
+        # В режиме окрестности выбранный узел становится её центром
+        if self.switch_focus.get_active() and node_name != self.focus_center:
+            self.focus_center = node_name
+            self.focus_changed()
+        self.show_distances()
+        self.queue_redraw('view')
 
         if 'weight' in self.G.nodes[node_name]:
             self.entry_node_weight.set_text(str(self.G.nodes[node_name]['weight']))
@@ -176,30 +533,23 @@ class MainWindow(Gtk.ApplicationWindow):
             self.entry_node_weight.set_text('')
 
         if 'description' in self.G.nodes[node_name]:
-            desc = str(self.G.nodes[node_name]['description'].strip('"'))
-            if desc != '':
-                self.entry_node_desc.set_text(desc)
-            else:
-                self.entry_node_desc.set_text('')
+            # Кавычки внутри описания - часть текста, как в хранилище и .gbin
+            self.entry_node_desc.set_text(str(self.G.nodes[node_name]['description']))
         else:
             self.entry_node_desc.set_text('')
 
         if 'fillcolor' in self.G.nodes[node_name]:
-            hexcolor = self.rgb2hex(self.G.nodes[node_name]['fillcolor'])
+            hexcolor = rgba2hex(self.G.nodes[node_name]['fillcolor'])
             self.set_color_to_button(self.button_color, color_hex=hexcolor)
         else:
             self.set_color_to_button(self.button_color)
         
-        self.box_edges_clear()
-        for edge in self.G.edges(node_name, data=True):
-            if 'fillcolor' not in edge[2]:
-                color = 'rgb(0,0,0)'
-            else:
-                color = edge[2]['fillcolor']
-            self.add_edge_field(node2=edge[1], weight=edge[2]['weight'], color=color)
-        if self.switch_edges.get_active() is False:
-            for _, _, entry2, _ in self.gui_edges:
-                entry2.hide()
+        # Список заменяется одним splice: виджеты создаются только на видимые строки
+        rows = [
+            EdgeRow(v, str(data['weight']) if data['weight'] else '', data.get('fillcolor', EDGE_RGBA))
+            for _, v, data in self.G.edges(node_name, data=True)
+        ]
+        self.edge_rows.splice(0, self.edge_rows.get_n_items(), rows)
 
     def update_node(self, button=None):
         def is_good_name(name:str) -> bool:
@@ -230,26 +580,23 @@ class MainWindow(Gtk.ApplicationWindow):
         else:
             node_weight = 0
 
-        fillcolor = self.button_color.get_rgba().to_string()
+        fillcolor = self.rgba_from_button(self.button_color)
 
         description = self.entry_node_desc.get_text()
 
-        self.G.add_node(node_name, weight=node_weight, fillcolor=fillcolor, description=description)
-
         edge_mas = []
-        for _, entry_1, entry_2, button_color in self.gui_edges:
-            node_name_second = entry_1.get_text().strip()
-            edge_weight = entry_2.get_text().strip()
-            color = button_color.get_rgba().to_string()
+        # Строки списка могут быть не на экране, поэтому без grab_focus
+        for row in self.edge_rows:
+            node_name_second = row.target.strip()
+            edge_weight = row.weight.strip()
+            color = row.color
 
             if node_name_second:
                 if is_good_name(node_name_second) is False:
-                    entry_1.grab_focus()
                     self.label_error.show()
-                    self.label_error.set_label('Неверное имя узла')
+                    self.label_error.set_label(f'Неверное имя узла {node_name_second}')
                     return
             else:
-                entry_1.grab_focus()
                 self.label_error.show()
                 self.label_error.set_label('Имя не может быть пустым')
                 return
@@ -259,12 +606,10 @@ class MainWindow(Gtk.ApplicationWindow):
                     try:
                         edge_weight = int(edge_weight)
                     except ValueError:
-                        entry_2.grab_focus()
-                        self.label_error.set_label('Вес должен быть числом')
+                        self.label_error.set_label(f'Вес грани ({node_name}, {node_name_second}) должен быть числом')
                         self.label_error.show()
                         return
                 else:
-                    entry_2.grab_focus()
                     self.label_error.set_text(f'У грани ({node_name}, {node_name_second}) не указан вес')
                     self.label_error.show()
                     return
@@ -272,20 +617,29 @@ class MainWindow(Gtk.ApplicationWindow):
                 edge_weight = 0
             edge_mas.append((node_name, node_name_second, edge_weight, color))
 
-        edges = list(self.G.edges(node_name))
-        self.G.remove_edges_from(edges)
-        for node_name, node_name_second, edge_weight, color in edge_mas:
-            self.G.add_edge(node_name, node_name_second, weight=edge_weight, fillcolor=color)
-
-        self.redraw()
+        # Применяется только разница с текущим графом
+        with span('edit.diff'):
+            edit = node_edit(
+                self.G,
+                node_name,
+                {'weight': node_weight, 'fillcolor': fillcolor, 'description': description},
+                {second: {'weight': weight, 'fillcolor': color} for _, second, weight, color in edge_mas}
+            )
+        if edit is None:
+            return
+        self.journal.record(edit)
+        self.commit_edit(edit)
+        self.update_undo_buttons()
 
     def remove_node(self, button=None):
         node_name = self.entry_node_name.get_text().strip()
         if node_name in self.G.nodes:
-            self.G.remove_node(node_name)
+            edit = remove_edit(self.G, node_name)
+            self.journal.record(edit)
             self.all_clear()
 
-            self.redraw()
+            self.commit_edit(edit)
+            self.update_undo_buttons()
         else:
             self.entry_node_name.grab_focus()
             self.label_error.show()
@@ -301,10 +655,18 @@ class MainWindow(Gtk.ApplicationWindow):
                 ttitle = 'Open File'
                 taction = Gtk.FileChooserAction.OPEN
                 tbname ='Open'
+            case 'save_bin':
+                ttitle = 'Save File (*.gbin)'
+                taction = Gtk.FileChooserAction.SAVE
+                tbname ='Save (*.gbin)'
             case 'save_pic':
                 ttitle = 'Save File (*.png)'
                 taction = Gtk.FileChooserAction.SAVE
                 tbname ='Save (*.png)'
+            case 'save_trace':
+                ttitle = 'Save File (*.json)'
+                taction = Gtk.FileChooserAction.SAVE
+                tbname ='Save (*.json)'
 
         dialog = Gtk.FileChooserDialog(
             title=ttitle,
@@ -323,65 +685,281 @@ class MainWindow(Gtk.ApplicationWindow):
             match action:
                 case 'save_dot':
                     self.save_dot(filename)
+                case 'save_bin':
+                    self.save_bin(filename)
                 case 'open_dot':
                     self.load_dot(filename)
                 case 'save_pic':
                     self.save_pic(filename)
+                case 'save_trace':
+                    self.save_trace(filename)
             dialog.destroy()
 
     def load_dot(self, filename:str):
+        # Файл читается в рабочем потоке, окно остаётся отзывчивым
+        self.load_token = token = object()
+        self.progress_load.set_fraction(0)
+        self.progress_load.show()
+        threading.Thread(target=self.run_load_dot, args=(filename, token), daemon=True).start()
+
+    def run_load_dot(self, filename, token):
+        def progress(fraction):
+            GLib.idle_add(self.load_progress, token, fraction)
+
+        try:
+            with span('load.read'):
+                G = read_graph(filename, progress=progress)
+        except (OSError, UnicodeDecodeError, ValueError):
+            GLib.idle_add(self.load_failed, token)
+        else:
+            with span('load.store'):
+                store = GraphStore.from_graph(G)
+            # Копия для потока автосохранения снимается здесь, а не в главном цикле
+            GLib.idle_add(self.load_done, token, G, store, G.copy())
+
+    def load_progress(self, token, fraction):
+        if token is self.load_token:
+            self.progress_load.set_fraction(fraction)
+        return GLib.SOURCE_REMOVE
+
+    def load_failed(self, token):
+        if token is self.load_token:
+            self.load_token = None
+            self.progress_load.hide()
+            self.label_error.set_label('Ошибка в файле')
+            self.label_error.show()
+        return GLib.SOURCE_REMOVE
+
+    @timed('load.apply')
+    def load_done(self, token, G, store, mirror=None):
+        # mirror - копия графа для автосохранения; у восстановленного графа
+        # её нет, поток автосохранения уже работает с ним
+        if token is not self.load_token:
+            return GLib.SOURCE_REMOVE
+        self.load_token = None
+        self.progress_load.hide()
+
         self.all_clear()
-        self.G.clear()
-        self.G = nx.nx_pydot.read_dot(filename)
+        self.G = G
         self.G.graph['graph'] = {'rankdir':'LR'}
-        try:
-            self.G.remove_node('\\n')
-        except Exception:
-            pass
+        self.store = store
+        if mirror is not None:
+            self.autosave.reset(mirror)
+            self.label_autosave.hide()
+            self.recovery_edits = None
 
         if self.G.is_directed():
             self.label_di.set_text('DiGraph')
-            self.G = nx.DiGraph(self.G)
         else:
             self.label_di.set_text('Graph')
-            self.G = nx.Graph(self.G)
 
-        self.redraw()
+        self.graph_changed()
+        return GLib.SOURCE_REMOVE
 
+    def autosave_recovered(self, G):
+        # Выполняется в потоке автосохранения, как run_load_dot
+        if G is None:
+            GLib.idle_add(self.recovery_done, None, None, None)
+            return
+        store = GraphStore.from_graph(G)
+        GLib.idle_add(self.recovery_done, G, store, G.copy())
+
+    def recovery_done(self, G, store, mirror):
+        edits = self.recovery_edits
+        self.recovery_edits = None
+        if G is None:
+            return GLib.SOURCE_REMOVE
+        # Граф окна уже заменён открытым или новым графом (или файл ещё
+        # открывается): восстановленный граф не нужен
+        if edits is None or self.load_token is not None:
+            self.autosave.reset(self.G.copy())
+            return GLib.SOURCE_REMOVE
+        self.load_token = token = object()
+        self.load_done(token, G, store)
+        # Восстановленного графа нет ни в одном файле: снимок пишется сразу
+        self.autosave.reset(mirror, snapshot=True)
+        # Правки, сделанные в окне до этого момента, повторяются поверх
+        # восстановленного графа и попадают в журнал отмены и автосохранение
+        for edit in edits:
+            edit = rebase_edit(self.G, edit)
+            if edit is not None:
+                self.journal.record(edit)
+                self.commit_edit(edit)
+        self.update_undo_buttons()
+        self.label_autosave.set_label('Восстановлен граф после сбоя')
+        self.label_autosave.show()
+        return GLib.SOURCE_REMOVE
+
+    def autosave_failed(self):
+        self.label_autosave.set_label('Ошибка автосохранения')
+        self.label_autosave.show()
+        return GLib.SOURCE_REMOVE
+
+    def window_closed(self, window):
+        # Штатное закрытие: журнал автосохранения больше не нужен. Окно
+        # закрывается сразу, а приложение ждёт поток через hold
+        app = self.get_application()
+        app.hold()
+        slot = self.autosave_slot
+        self.autosave.close(
+            keep=self.keep_autosave,
+            on_closed=lambda: GLib.idle_add(app.autosave_closed, slot)
+        )
+        return False
+
+    @timed('save.pic')
     def save_pic(self, filename):
+        if self.fig is None:
+            return
         if filename[-4:].lower() != '.png' or len(filename) == 3:
             filename += '.png'
         self.fig.savefig(filename)
 
+    @timed('save.dot')
     def save_dot(self, filename):
         if filename[-4:].lower() != '.txt' or len(filename) == 3:
             filename += '.txt'
-        nx.nx_pydot.write_dot(self.G, filename)
+        write_dot(self.G, filename)
+
+    @timed('save.bin')
+    def save_bin(self, filename):
+        if filename[-5:].lower() != '.gbin':
+            filename += '.gbin'
+        try:
+            write_graph_bin(self.G, filename)
+        except ValueError:
+            self.label_error.set_label('Вес должен быть числом')
+            self.label_error.show()
+
+    def save_trace(self, filename):
+        if filename[-5:].lower() != '.json':
+            filename += '.json'
+        try:
+            profiler.export_chrome(filename)
+        except OSError:
+            self.label_error.set_label('Ошибка записи файла')
+            self.label_error.show()
 
-    def rgb2hex(self, rgb:str):
-        rgb = rgb.strip('"')
-        if 'rgba' in rgb:
-            colors = rgb[5:-1].split(',')
+    def toggle_profile(self, button):
+        # Замеры пишутся только при нажатой кнопке, иначе отрезки ничего не стоят
+        profiler.enabled = button.get_active()
+        self.button_trace.set_sensitive(profiler.enabled or bool(profiler.events))
+        if profiler.enabled:
+            self.update_profile()
+            self.label_profile.show()
+            self.profile_timeout = GLib.timeout_add(self.PROFILE_PERIOD, self.update_profile)
         else:
-            colors = rgb[4:-1].split(',')
-        colors = list(map(lambda c: hex(int(c)).lstrip('0x').zfill(2), colors))
-        return f'#{colors[0]}{colors[1]}{colors[2]}'
+            self.label_profile.hide()
+            if self.profile_timeout is not None:
+                GLib.source_remove(self.profile_timeout)
+                self.profile_timeout = None
 
-    def choose_node(self, event):
-        node_not_found = True
-        for node in self.pos:
-            posx, posy = self.pos[node]
+    def update_profile(self):
+        # Последний замер и среднее по окну для каждой фазы
+        text = profiler.summary_text()
+        self.label_profile.set_text(f'{"":<18} {"посл.":>8} {"средн.":>8}\n{text}' if text else '')
+        return GLib.SOURCE_CONTINUE
 
-            try:
-                well_node_size = self.yr * 0.02
-                if event.xdata > posx - well_node_size and event.xdata < posx + well_node_size and event.ydata > posy - well_node_size and event.ydata < posy + well_node_size:
-                    self.read_node(node)
-                    node_not_found = False
-            except Exception:
+    def choose_node(self, event):
+        if event.inaxes is not self.ax:
+            if self.pos:
                 self.label_error.set_text('Это рамка :3')
                 self.label_error.show()
-        if node_not_found:
             self.all_clear()
+            return
+
+        # Индекс перестраивается только после новой раскладки
+        if self.node_index is None or self.node_index.pos is not self.pos:
+            self.node_index = SpatialIndex(self.pos)
+
+        node = self.node_index.nearest(
+            self.ax.transData, event.x, event.y, self.renderer.hit_radius()
+        )
+        if self.switch_path.get_active():
+            if node is not None:
+                self.pick_path_node(node)
+        elif node is None:
+            self.all_clear()
+        else:
+            self.read_node(node)
+
+    def pick_path_node(self, node):
+        # Первый щелчок - начало пути, второй - цель, следующий - новое начало
+        if self.path_source is None or self.path_target is not None:
+            self.path_source, self.path_target = node, None
+        else:
+            self.path_target = node
+        self.find_path()
+        self.queue_redraw('view')
+
+    def find_path(self):
+        source, target = self.path_source, self.path_target
+        if source not in self.G:
+            self.path_source = self.path_target = None
+            self.show_path()
+            self.label_path.set_text('Выберите начало пути' if self.switch_path.get_active() else '')
+            return
+        if target not in self.G:
+            self.path_target = None
+            self.show_path([source])
+            self.label_path.set_text(f'{source} → ? Выберите цель')
+            return
+
+        try:
+            path, cost = self.path_cache.path(self.G, source, target)
+        except (KeyError, ValueError):
+            self.show_path([source, target])
+            self.label_path.set_text('Вес должен быть неотрицательным числом')
+            return
+        if path is None:
+            self.show_path([source, target])
+            self.label_path.set_text(f'{source} → {target}: пути нет')
+        else:
+            self.show_path(path)
+            self.label_path.set_text(f'{source} → {target}: {cost:g}, узлов {len(path)}')
+
+    def show_path(self, path=()):
+        # До появления холста путь передаётся ему в create_canvas
+        if self.renderer is not None:
+            self.renderer.set_path(path)
+
+    def zoom_canvas(self, event):
+        # Приближение колесом вокруг курсора
+        if event.inaxes is not self.ax:
+            return
+        factor = 1 / 1.2 if event.button == 'up' else 1.2
+        x0, x1 = self.ax.get_xlim()
+        y0, y1 = self.ax.get_ylim()
+        self.ax.set_xlim(event.xdata - (event.xdata - x0) * factor, event.xdata + (x1 - event.xdata) * factor)
+        self.ax.set_ylim(event.ydata - (event.ydata - y0) * factor, event.ydata + (y1 - event.ydata) * factor)
+        self.queue_redraw('navigate')
+
+    def press_canvas(self, event):
+        if event.button in (2, 3):
+            if event.inaxes is self.ax:
+                self.pan_start = (event.x, event.y, self.ax.get_xlim(), self.ax.get_ylim())
+            return
+        self.choose_node(event)
+
+    def pan_canvas(self, event):
+        # Сдвиг в пикселях переводится в данные по пределам на момент нажатия
+        if self.pan_start is None:
+            return
+        x, y, (x0, x1), (y0, y1) = self.pan_start
+        bbox = self.ax.bbox
+        dx = (event.x - x) * (x1 - x0) / max(bbox.width, 1)
+        dy = (event.y - y) * (y1 - y0) / max(bbox.height, 1)
+        self.ax.set_xlim(x0 - dx, x1 - dx)
+        self.ax.set_ylim(y0 - dy, y1 - dy)
+        self.queue_redraw('navigate')
+
+    def release_canvas(self, event):
+        self.pan_start = None
+
+    def navigation_settled(self):
+        self.settle_timeout = None
+        self.queue_redraw('view')
+        return GLib.SOURCE_REMOVE
 
     def switch_change_astar(self, widget, is_activated):
         if is_activated:
@@ -389,19 +967,17 @@ class MainWindow(Gtk.ApplicationWindow):
         else:
             self.entry_node_weight.hide()
         
-        self.redraw()
+        self.queue_redraw('labels')
 
     def switch_change_edges(self, widget, is_activated):
         if is_activated:
             self.w_scale.show()
-            for _, _, entry2, _ in self.gui_edges:
-                entry2.show()
         else:
             self.w_scale.hide()
-            for _, _, entry2, _ in self.gui_edges:
-                entry2.hide()
+        for box in self.edge_row_boxes:
+            box.entry_weight.set_visible(is_activated)
         
-        self.redraw()
+        self.queue_redraw('labels')
 
     def switch_change_desc(self, widget, is_activated):
         if is_activated:
@@ -409,17 +985,248 @@ class MainWindow(Gtk.ApplicationWindow):
         else:
             self.entry_node_desc.hide()
         
-        self.redraw()
+        self.queue_redraw('labels')
 
     def scale_changed(self, scale):
         self.slider_value = scale.get_value()
         
-        self.redraw()
+        self.queue_redraw('labels')
     
+    def switch_change_path(self, widget, is_activated):
+        self.path_source = self.path_target = None
+        self.label_path.set_visible(is_activated)
+        self.find_path()
+        self.queue_redraw('view')
+
+    def switch_change_distances(self, widget, is_activated):
+        self.label_distances.set_visible(is_activated)
+        self.start_distance_index()
+
+    def start_distance_index(self):
+        # Индекс строится заново по снимку хранилища: смежность собирается
+        # в рабочем потоке, правки до конца построения встанут в очередь за ним.
+        # Ошибку веса сообщит distance_op_done
+        self.distance_index = None
+        if not self.switch_distances.get_active():
+            return
+        index = DistanceIndex()
+        snapshot = weighted_snapshot(self.store)
+        directed = self.store.directed
+
+        def build():
+            index.load(snapshot_adjacency(snapshot), directed)
+            index.build(lambda: index is not self.distance_index)
+
+        self.distance_index = index
+        self.post_distance_op(index, build)
+
+    def update_distance_index(self, edit):
+        # Узлы, чьи грани поменялись, передают индексу свои новые грани
+        index = self.distance_index
+        sources = {u for u, _ in edit.weighted_edges()}
+        for node, (before, after) in edit.nodes.items():
+            if after is None:
+                sources.discard(node)
+                self.post_distance_op(index, lambda node=node: index.remove_node(node))
+            elif before is None:
+                sources.add(node)
+        try:
+            changes = {
+                node: {v: edge_cost(data) for _, v, data in self.G.edges(node, data=True)}
+                for node in sources if node in self.G
+            }
+        except (KeyError, ValueError):
+            self.distance_index = None
+            self.label_distances.set_text('Вес должен быть неотрицательным числом')
+            return
+        for node, node_edges in changes.items():
+            self.post_distance_op(index, lambda node=node, edges=node_edges: index.set_node_edges(node, edges))
+
+    def post_distance_op(self, index, op):
+        self.distance_pending += 1
+        self.distance_ops.put((index, op))
+        self.show_distances()
+
+    def run_distance_ops(self):
+        # Рабочий поток индекса расстояний, правки применяются по порядку
+        while True:
+            index, op = self.distance_ops.get()
+            try:
+                if index is self.distance_index:
+                    op()
+            except (KeyError, ValueError):
+                GLib.idle_add(self.distance_op_done, index, False)
+            else:
+                GLib.idle_add(self.distance_op_done, index, True)
+
+    def distance_op_done(self, index, ok):
+        self.distance_pending -= 1
+        if not ok and index is self.distance_index:
+            self.distance_index = None
+            self.label_distances.set_text('Вес должен быть неотрицательным числом')
+            return GLib.SOURCE_REMOVE
+        self.show_distances()
+        return GLib.SOURCE_REMOVE
+
+    def show_distances(self):
+        # Ближайшие к выбранному узлу, пока индекс не занят правками
+        node_name = self.entry_node_name.get_text().strip()
+        index = self.distance_index
+        if index is None or node_name not in self.G:
+            return
+        if self.distance_pending:
+            self.label_distances.set_text('Расстояния обновляются…')
+            return
+        if node_name not in index.index:
+            return
+        nearest = index.distances(node_name, limit=self.DISTANCE_LIMIT)
+        lines = [f'{node}: {dist:g}' for node, dist in nearest]
+        self.label_distances.set_text('\n'.join(lines) or 'Других достижимых узлов нет')
+
+    def switch_change_analytics(self, widget, is_activated):
+        self.box_analytics.set_visible(is_activated)
+        self.label_analytics.set_visible(is_activated)
+        if is_activated:
+            self.schedule_analytics(delay=0)
+        else:
+            self.analytics_token = None
+
+    def schedule_analytics(self, delay=ANALYTICS_DELAY):
+        # Пока граф правится, расчёт откладывается; готовый результат той же
+        # структуры берётся как есть
+        if self.analytics_timeout is not None:
+            GLib.source_remove(self.analytics_timeout)
+            self.analytics_timeout = None
+        if not self.switch_analytics.get_active():
+            return
+        if self.analytics is not None and self.analytics.revision == self.structure_revision:
+            self.show_analytics()
+            return
+        self.analytics_token = None
+        self.button_analytics_color.set_sensitive(False)
+        self.label_analytics.set_text('Считается…')
+        self.analytics_timeout = GLib.timeout_add(delay, self.start_analytics)
+
+    def start_analytics(self):
+        self.analytics_timeout = None
+        self.analytics_token = token = object()
+        # Снимок снимается в главном цикле, смежность строится уже в потоке
+        with span('analytics.snapshot'):
+            snapshot = store_snapshot(self.store)
+        threading.Thread(
+            target=self.run_analytics,
+            args=(token, self.structure_revision, snapshot),
+            daemon=True
+        ).start()
+        return GLib.SOURCE_REMOVE
+
+    def run_analytics(self, token, revision, snapshot):
+        # Выполняется в рабочем потоке, как run_layout_job
+        try:
+            with span('analytics.csr'):
+                analytics = Analytics(CSRGraph(*snapshot), revision)
+            finished = analytics.compute(lambda: token is not self.analytics_token)
+        except Exception:
+            GLib.idle_add(self.analytics_failed, token)
+        else:
+            if finished:
+                GLib.idle_add(self.analytics_done, token, analytics)
+
+    def analytics_failed(self, token):
+        if token is self.analytics_token:
+            self.analytics_token = None
+            self.label_analytics.set_text('Ошибка аналитики графа')
+        return GLib.SOURCE_REMOVE
+
+    def analytics_done(self, token, analytics):
+        if token is not self.analytics_token:
+            return GLib.SOURCE_REMOVE
+        self.analytics_token = None
+        self.analytics = analytics
+        self.show_analytics()
+        return GLib.SOURCE_REMOVE
+
+    def show_analytics(self):
+        analytics = self.analytics
+        csr = analytics.csr
+        lines = [f'Узлов {csr.n}, граней {len(csr.src)}']
+        if csr.n:
+            degrees = analytics.metrics['degree']
+            lines.append(f'Степень: от {degrees.min()} до {degrees.max()}, в среднем {degrees.mean():.2f}')
+            lines += [
+                f'  {low}: {count}' if low == high else f'  {low}-{high}: {count}'
+                for low, high, count in degree_bins(analytics.degree_hist)
+            ]
+            sizes = analytics.component_sizes
+            lines.append(f'Компонент {len(sizes)}, в крупнейшей {sizes[0]} узлов')
+            lines.append('PageRank:')
+            lines += [f'  {node}: {value:.4f}' for node, value in analytics.top('pagerank', self.ANALYTICS_TOP)]
+            if analytics.approximate:
+                lines.append(f'Посредничество (оценка по {analytics.samples} узлам):')
+            else:
+                lines.append('Посредничество:')
+            lines += [f'  {node}: {value:.4f}' for node, value in analytics.top('betweenness', self.ANALYTICS_TOP)]
+        lines.append(f'Посчитано за {analytics.seconds:.2f} с')
+        self.label_analytics.set_text('\n'.join(lines))
+        self.button_analytics_color.set_sensitive(bool(csr.n))
+
+    def color_by_metric(self, button=None):
+        # Раскраска - обычная правка атрибута fillcolor: отменяется, попадает
+        # в автосохранение и DOT. Структура не меняется, аналитика остаётся в силе
+        analytics = self.analytics
+        if analytics is None or analytics.revision != self.structure_revision:
+            return
+        metric = self.ANALYTICS_METRICS[self.dropdown_analytics.get_selected()][0]
+        with span('analytics.color'):
+            nodes = {}
+            for node, color in analytics.colors(metric).items():
+                data = self.G.nodes[node]
+                if data.get('fillcolor') != color:
+                    nodes[node] = (dict(data), {**data, 'fillcolor': color})
+        if not nodes:
+            return
+        edit = Edit(nodes, {})
+        self.journal.record(edit)
+        self.commit_edit(edit)
+        self.update_undo_buttons()
+        node_name = self.entry_node_name.get_text().strip()
+        if node_name in nodes:
+            self.read_node(node_name, change=False)
+
+    def switch_change_incremental(self, widget, is_activated):
+        self.layout_cache.incremental = is_activated
+
+    def layout_changed(self, dropdown, pspec):
+        self.layout_cache.set_engine(self.layout_engines[dropdown.get_selected()])
+        self.focus_layouts.set_engine(self.layout_engines[dropdown.get_selected()])
+
+        self.queue_redraw('layout')
+
     def check_node(self, widget):
+        # Подсказки обновляются сразу, а узел читается, когда набор затих
+        node_name = self.entry_node_name.get_text()
+        self.completion_model.clear()
+        if node_name:
+            for name in self.name_index.matches(node_name, self.COMPLETION_LIMIT):
+                if name != node_name:
+                    self.completion_model.append([name])
+
+        if self.check_timeout is not None:
+            GLib.source_remove(self.check_timeout)
+        self.check_timeout = GLib.timeout_add(self.CHECK_DELAY, self.check_node_delayed)
+
+    def check_node_delayed(self):
+        self.check_timeout = None
         node_name = self.entry_node_name.get_text()
         if node_name in self.G.nodes:
             self.read_node(node_name, change=False)
+        return GLib.SOURCE_REMOVE
+
+    def completion_selected(self, completion, model, tree_iter):
+        node_name = model[tree_iter][0]
+        if node_name in self.G.nodes:
+            self.read_node(node_name)
+        return True
 
     def build_main_window(self):
         self.set_default_size(950, 600)
@@ -455,6 +1262,47 @@ class MainWindow(Gtk.ApplicationWindow):
         self.button_dot_write.connect('clicked', self.choose_file, 'save_dot')
         self.header.pack_start(self.button_dot_write)
 
+        # Кнопка сохранения в двоичный файл
+        self.button_bin_write = Gtk.Button(
+            width_request=32,
+            height_request=32,
+            icon_name='document-save-as',
+            tooltip_text='Сохранить в двоичный файл графа'
+        )
+        self.button_bin_write.connect('clicked', self.choose_file, 'save_bin')
+        self.header.pack_start(self.button_bin_write)
+
+        self.header.pack_start(Gtk.Separator())
+
+        # Отмена и повтор правок
+        self.button_undo = Gtk.Button(
+            width_request=32,
+            height_request=32,
+            icon_name='edit-undo',
+            tooltip_text='Отменить правку (Ctrl+Z)',
+            sensitive=False
+        )
+        self.button_undo.connect('clicked', self.undo)
+        self.header.pack_start(self.button_undo)
+
+        self.button_redo = Gtk.Button(
+            width_request=32,
+            height_request=32,
+            icon_name='edit-redo',
+            tooltip_text='Повторить правку (Ctrl+Shift+Z)',
+            sensitive=False
+        )
+        self.button_redo.connect('clicked', self.redo)
+        self.header.pack_start(self.button_redo)
+
+        shortcuts = Gtk.ShortcutController()
+        for trigger, callback in (('<Control>z', self.undo), ('<Control><Shift>z', self.redo)):
+            shortcuts.add_shortcut(Gtk.Shortcut(
+                trigger=Gtk.ShortcutTrigger.parse_string(trigger),
+                action=Gtk.CallbackAction.new(callback)
+            ))
+        self.add_controller(shortcuts)
+
         self.header.pack_start(Gtk.Separator())
 
         # Кнопка сохранения рабочей области в .png файл
@@ -467,6 +1315,26 @@ class MainWindow(Gtk.ApplicationWindow):
         self.button_save.connect('clicked', self.choose_file, 'save_pic')
         self.header.pack_start(self.button_save)
 
+        # Замеры времени по фазам: вывод поверх холста и запись трассы
+        self.button_profile = Gtk.ToggleButton(
+            width_request=32,
+            height_request=32,
+            icon_name='utilities-system-monitor',
+            tooltip_text='Замерять время перерисовки, чтения и записи'
+        )
+        self.button_profile.connect('toggled', self.toggle_profile)
+        self.header.pack_start(self.button_profile)
+
+        self.button_trace = Gtk.Button(
+            width_request=32,
+            height_request=32,
+            icon_name='document-export',
+            tooltip_text='Сохранить трассу замеров для chrome://tracing',
+            sensitive=False
+        )
+        self.button_trace.connect('clicked', self.choose_file, 'save_trace')
+        self.header.pack_start(self.button_trace)
+
         # Кнопка обновления рабочей области
         self.button_new = Gtk.Button(
             width_request=32,
@@ -482,6 +1350,50 @@ class MainWindow(Gtk.ApplicationWindow):
         )
         self.header.pack_start(self.label_di)
 
+        self.header.pack_start(Gtk.Separator())
+
+        # Выбор алгоритма расположения узлов
+        self.layout_engines = list(LAYOUT_ENGINES)
+        self.dropdown_layout = Gtk.DropDown.new_from_strings(
+            [engine.title() for engine in self.layout_engines]
+        )
+        self.dropdown_layout.set_tooltip_text('Алгоритм расположения узлов')
+        self.dropdown_layout.connect('notify::selected', self.layout_changed)
+        self.header.pack_start(self.dropdown_layout)
+
+        # Дорасстановка узлов после правок без полной перерисовки раскладки
+        self.switch_incremental = Gtk.Switch(
+            active=False,
+            tooltip_text='Сохранять расположение узлов при правках'
+        )
+        self.switch_incremental.connect('state-set', self.switch_change_incremental)
+        self.header.pack_start(Gtk.Label(label='Inc'))
+        self.header.pack_start(self.switch_incremental)
+
+        # Режим поиска пути: щелчками выбираются начало и цель
+        self.switch_path = Gtk.Switch(
+            active=False,
+            tooltip_text='Поиск кратчайшего пути A*: веса узлов - оценка, веса граней - длина'
+        )
+        self.switch_path.connect('state-set', self.switch_change_path)
+        self.header.pack_start(Gtk.Label(label='Path'))
+        self.header.pack_start(self.switch_path)
+
+        # Индикатор фоновой раскладки
+        self.spinner_layout = Gtk.Spinner(
+            tooltip_text='Идёт расположение узлов'
+        )
+        self.header.pack_start(self.spinner_layout)
+
+        # Прогресс чтения файла
+        self.progress_load = Gtk.ProgressBar(
+            valign=Gtk.Align.CENTER,
+            width_request=80,
+            tooltip_text='Чтение файла'
+        )
+        self.progress_load.hide()
+        self.header.pack_start(self.progress_load)
+
         # Здесь название окна
 
         # Отображение весов граней
@@ -533,12 +1445,24 @@ class MainWindow(Gtk.ApplicationWindow):
         self.header.pack_end(self.w_scale)
         self.w_scale.hide()
 
-        ## Панель для изображения
-        self.canvas = FigureCanvas(self.fig)
-        self.canvas.set_hexpand(True)
-        self.canvas.set_vexpand(True)
-        self.canvas.set_size_request(400, 400)
-        big_box.append(self.canvas)
+        ## Панель для изображения, холст вставляется в create_canvas
+        self.canvas_overlay = Gtk.Overlay(
+            child=Gtk.Box(hexpand=True, vexpand=True, width_request=400, height_request=400)
+        )
+
+        # Замеры поверх холста, в правом верхнем углу
+        self.label_profile = Gtk.Label(
+            halign=Gtk.Align.END,
+            valign=Gtk.Align.START,
+            margin_top=5,
+            margin_end=5,
+            can_target=False
+        )
+        self.label_profile.add_css_class('monospace')
+        self.label_profile.add_css_class('osd')
+        self.label_profile.hide()
+        self.canvas_overlay.add_overlay(self.label_profile)
+        big_box.append(self.canvas_overlay)
 
         ## Правая панель
         self.right_panel = Gtk.Box(
@@ -565,8 +1489,17 @@ class MainWindow(Gtk.ApplicationWindow):
             hexpand=True
         )
 
-        self.entrycompletion = Gtk.EntryCompletion()
-
+        # Подсказки берутся из NamePrefixIndex уже отобранными и
+        # упорядоченными, поэтому своя проверка совпадений не нужна
+        self.completion_model = Gtk.ListStore(str)
+        self.entrycompletion = Gtk.EntryCompletion(
+            model=self.completion_model,
+            text_column=0,
+            minimum_key_length=1
+        )
+        self.entrycompletion.set_match_func(lambda *args: True)
+        self.entrycompletion.connect('match-selected', self.completion_selected)
+        self.entry_node_name.set_completion(self.entrycompletion)
 
         self.entry_node_name.connect('activate', self.update_node)
         self.entry_node_name.connect('changed', self.check_node)
@@ -622,6 +1555,120 @@ class MainWindow(Gtk.ApplicationWindow):
 
         self.right_panel.append(Gtk.Separator())
 
+        ## Расстояния от выбранного узла
+        box_header_distances = Gtk.Box(
+            orientation=Gtk.Orientation.HORIZONTAL,
+            spacing=5
+        )
+        self.right_panel.append(box_header_distances)
+        box_header_distances.append(Gtk.Label(
+            label='Расстояния',
+            hexpand=True
+        ))
+        self.switch_distances = Gtk.Switch(
+            active=False,
+            tooltip_text='Считать расстояния между всеми узлами в фоне'
+        )
+        self.switch_distances.connect('state-set', self.switch_change_distances)
+        box_header_distances.append(self.switch_distances)
+
+        self.label_distances = Gtk.Label(
+            xalign=0,
+            selectable=True
+        )
+        self.label_distances.hide()
+        self.right_panel.append(self.label_distances)
+
+        # Режим окрестности: только k шагов от выбранного узла, не больше заданного числа узлов
+        box_header_focus = Gtk.Box(
+            orientation=Gtk.Orientation.HORIZONTAL,
+            spacing=5
+        )
+        self.right_panel.append(box_header_focus)
+        box_header_focus.append(Gtk.Label(
+            label='Окрестность',
+            hexpand=True
+        ))
+        self.switch_focus = Gtk.Switch(
+            active=False,
+            tooltip_text='Раскладывать и рисовать только окрестность выбранного узла'
+        )
+        self.switch_focus.connect('state-set', self.switch_change_focus)
+        box_header_focus.append(self.switch_focus)
+
+        self.box_focus = Gtk.Box(
+            orientation=Gtk.Orientation.HORIZONTAL,
+            spacing=5
+        )
+        self.box_focus.hide()
+        self.right_panel.append(self.box_focus)
+        self.box_focus.append(Gtk.Label(label='Шагов'))
+        self.spin_focus_hops = Gtk.SpinButton.new_with_range(1, 10, 1)
+        self.spin_focus_hops.set_value(2)
+        self.spin_focus_hops.set_tooltip_text('Сколько шагов от узла-фокуса показывать')
+        self.spin_focus_hops.connect('value-changed', self.focus_settings_changed)
+        self.box_focus.append(self.spin_focus_hops)
+        self.box_focus.append(Gtk.Label(label='Узлов'))
+        self.spin_focus_budget = Gtk.SpinButton.new_with_range(10, 20000, 50)
+        self.spin_focus_budget.set_value(500)
+        self.spin_focus_budget.set_tooltip_text('Больше узлов окрестность не включает, ближние первыми')
+        self.spin_focus_budget.connect('value-changed', self.focus_settings_changed)
+        self.box_focus.append(self.spin_focus_budget)
+
+        self.label_focus = Gtk.Label(
+            xalign=0,
+            wrap=True,
+            tooltip_text='Граничные узлы обведены пунктиром: выберите такой узел, чтобы раскрыть его соседей'
+        )
+        self.label_focus.hide()
+        self.right_panel.append(self.label_focus)
+
+        # Аналитика: степени, компоненты, PageRank и посредничество по всему графу
+        box_header_analytics = Gtk.Box(
+            orientation=Gtk.Orientation.HORIZONTAL,
+            spacing=5
+        )
+        self.right_panel.append(box_header_analytics)
+        box_header_analytics.append(Gtk.Label(
+            label='Аналитика',
+            hexpand=True
+        ))
+        self.switch_analytics = Gtk.Switch(
+            active=False,
+            tooltip_text='Считать метрики графа в фоне после каждой правки структуры'
+        )
+        self.switch_analytics.connect('state-set', self.switch_change_analytics)
+        box_header_analytics.append(self.switch_analytics)
+
+        self.box_analytics = Gtk.Box(
+            orientation=Gtk.Orientation.HORIZONTAL,
+            spacing=5
+        )
+        self.box_analytics.hide()
+        self.right_panel.append(self.box_analytics)
+        self.dropdown_analytics = Gtk.DropDown.new_from_strings(
+            [title for _, title in self.ANALYTICS_METRICS]
+        )
+        self.dropdown_analytics.set_tooltip_text('Метрика для раскраски узлов')
+        self.dropdown_analytics.set_hexpand(True)
+        self.box_analytics.append(self.dropdown_analytics)
+        self.button_analytics_color = Gtk.Button(
+            label='Раскрасить',
+            sensitive=False,
+            tooltip_text='Залить узлы цветом по выбранной метрике, правку можно отменить'
+        )
+        self.button_analytics_color.connect('clicked', self.color_by_metric)
+        self.box_analytics.append(self.button_analytics_color)
+
+        self.label_analytics = Gtk.Label(
+            xalign=0,
+            selectable=True
+        )
+        self.label_analytics.hide()
+        self.right_panel.append(self.label_analytics)
+
+        self.right_panel.append(Gtk.Separator())
+
         ## Грани
         box_header_edges = Gtk.Box(
             orientation=Gtk.Orientation.HORIZONTAL,
@@ -643,6 +1690,25 @@ class MainWindow(Gtk.ApplicationWindow):
         self.button_add_edge.connect('clicked', self.add_edge_field)
         box_header_edges.append(self.button_add_edge)
 
+        # Поиск и сортировка граней
+        box_edges_view = Gtk.Box(
+            orientation=Gtk.Orientation.HORIZONTAL,
+            spacing=5
+        )
+        self.right_panel.append(box_edges_view)
+
+        self.entry_edge_search = Gtk.SearchEntry(
+            placeholder_text='Поиск назначения',
+            hexpand=True
+        )
+        self.entry_edge_search.connect('search-changed', self.edge_search_changed)
+        box_edges_view.append(self.entry_edge_search)
+
+        self.dropdown_edge_sort = Gtk.DropDown.new_from_strings(['Порядок', 'Назначение', 'Вес'])
+        self.dropdown_edge_sort.set_tooltip_text('Сортировка граней')
+        self.dropdown_edge_sort.connect('notify::selected', self.edge_sort_changed)
+        box_edges_view.append(self.dropdown_edge_sort)
+
         scrolled_window_r = Gtk.ScrolledWindow(
             vexpand=True,
             min_content_width=330,
@@ -650,17 +1716,42 @@ class MainWindow(Gtk.ApplicationWindow):
         )
         self.right_panel.append(scrolled_window_r)
 
-        viewport_r = Gtk.Viewport()
-        scrolled_window_r.set_child(viewport_r)
+        # Список граней: модель -> фильтр -> сортировка -> ListView
+        self.edge_filter = Gtk.CustomFilter.new(self.edge_row_visible)
+        self.edge_sorter = Gtk.CustomSorter.new(self.compare_edge_rows)
+        edges_model = Gtk.SortListModel(
+            model=Gtk.FilterListModel(model=self.edge_rows, filter=self.edge_filter),
+            sorter=self.edge_sorter
+        )
 
-        self.box_edges = Gtk.Box(
-            orientation=Gtk.Orientation.VERTICAL,
-            spacing=5,
+        factory = Gtk.SignalListItemFactory()
+        factory.connect('setup', self.edge_row_setup)
+        factory.connect('bind', lambda factory, item: item.get_child().bind(item.get_item()))
+        factory.connect('unbind', lambda factory, item: item.get_child().unbind())
+        factory.connect('teardown', self.edge_row_teardown)
+
+        self.list_edges = Gtk.ListView(
+            model=Gtk.NoSelection(model=edges_model),
+            factory=factory,
             margin_bottom=5,
             margin_top=5
         )
+        scrolled_window_r.set_child(self.list_edges)
 
-        viewport_r.set_child(self.box_edges)
+        # Найденный путь
+        self.label_path = Gtk.Label(
+            wrap=True
+        )
+        self.label_path.hide()
+        self.right_panel.append(self.label_path)
+
+        # Состояние автосохранения: восстановление после сбоя и ошибки записи.
+        # Отдельно от label_error, который прячется при каждой перерисовке
+        self.label_autosave = Gtk.Label(
+            wrap=True
+        )
+        self.label_autosave.hide()
+        self.right_panel.append(self.label_autosave)
 
         # Текст предупреждения
         self.label_error = Gtk.Label(
@@ -676,90 +1767,88 @@ class MainWindow(Gtk.ApplicationWindow):
         button_apply.connect('clicked', self.update_node)
         self.right_panel.append(button_apply)
 
-    def add_edge_field(self, button=None, node2=None, weight=None, color=None):
-        def destroy_box(button, field, eli):
-            tname = eli[1].get_text()
-            self.gui_edges.remove(eli)
-            self.box_edges.remove(field)
-            if tname != '':
-                self.update_node()
+    def add_edge_field(self, button=None):
+        # Новая грань встаёт в начало списка, чтобы её было видно
+        self.edge_rows.insert(0, EdgeRow())
 
-        box_field = Gtk.Box(
-            orientation=Gtk.Orientation.HORIZONTAL,
-            spacing=5
-        )
-        self.box_edges.append(box_field)
-        entry_1 = Gtk.Entry(
-            placeholder_text='Назначение',
-            tooltip_text='Имя узла-назначения',
-            hexpand=True,
-            width_chars=12
-        )
-        entry_1.connect('activate', self.update_node)
-        box_field.append(entry_1)
-        box_field.append(Gtk.Label(label=':'))
-        entry_2 = Gtk.Entry(
-            placeholder_text='Расстояние',
-            tooltip_text='Расстояние до назначения',
-            width_chars=7
-        )
-        entry_2.connect('activate', self.update_node)
-        box_field.append(entry_2)
-        if self.switch_edges.get_active() is False:
-            entry_2.hide()
-        
-        button_color_edge = Gtk.ColorButton(
-            height_request=32,
-            tooltip_text='Цвет узла'
-        )
-        button_color_edge.connect('color-set', self.update_node)
-        box_field.append(button_color_edge)
+    def remove_edge_row(self, row):
+        found, position = self.edge_rows.find(row)
+        if found:
+            self.edge_rows.remove(position)
+            if row.target.strip():
+                self.update_node()
 
-        if node2:
-            entry_1.set_text(node2)
-        if weight:
-            entry_2.set_text(str(weight))
-        if color:
-            color = self.rgb2hex(color)
-            self.set_color_to_button(button_color_edge, color_hex=color)
+    def box_edges_clear(self):
+        self.edge_rows.remove_all()
+
+    def edge_row_setup(self, factory, list_item):
+        box = EdgeRowBox(self)
+        self.edge_row_boxes.append(box)
+        list_item.set_child(box)
+
+    def edge_row_teardown(self, factory, list_item):
+        box = list_item.get_child()
+        if box in self.edge_row_boxes:
+            self.edge_row_boxes.remove(box)
+
+    def edge_row_visible(self, row):
+        # Пустые (только что добавленные) грани видны при любом поиске
+        query = self.entry_edge_search.get_text().strip().lower()
+        return not query or not row.target or query in row.target.lower()
+
+    def compare_edge_rows(self, a, b, *args):
+        mode = self.dropdown_edge_sort.get_selected()
+        if mode == 1:
+            key_a, key_b = a.target, b.target
+        elif mode == 2:
+            key_a, key_b = self.edge_weight_key(a), self.edge_weight_key(b)
         else:
-            self.set_color_to_button(button_color_edge)
-
-        button_rm = Gtk.Button(
-            width_request=32,
-            height_request=32,
-            icon_name='edit-delete',
-            tooltip_text='Удалить выбранную грань'
-        )
+            return Gtk.Ordering.EQUAL
+        if key_a < key_b:
+            return Gtk.Ordering.SMALLER
+        if key_a > key_b:
+            return Gtk.Ordering.LARGER
+        return Gtk.Ordering.EQUAL
+
+    def edge_weight_key(self, row):
+        # Числа по значению, пустые и нечисловые веса в конце
+        try:
+            return (0, float(row.weight), '')
+        except ValueError:
+            return (1, 0.0, row.weight)
 
-        el = (box_field, entry_1, entry_2, button_color_edge)
-        self.gui_edges.append(el)
-        button_rm.connect('clicked', destroy_box, box_field, el)
-        box_field.append(button_rm)
+    def edge_search_changed(self, entry):
+        self.edge_filter.changed(Gtk.FilterChange.DIFFERENT)
 
-    def box_edges_clear(self):
-        for field, _, _, _ in self.gui_edges:
-            self.box_edges.remove(field)
-        self.gui_edges.clear()
+    def edge_sort_changed(self, dropdown, pspec):
+        self.edge_sorter.changed(Gtk.SorterChange.DIFFERENT)
 
     def pop_dialog(self, button=None):
         def to_directed(button):
             self.G = nx.DiGraph()
             self.G.graph['graph'] = {'rankdir':'LR'}
+            self.store = GraphStore(directed=True)
+            self.autosave.reset(self.G.copy())
+            self.label_autosave.hide()
+            self.recovery_edits = None
             dialog.destroy()
             self.all_clear()
             self.label_di.set_label('DiGraph')
 
-            self.redraw()
+            self.graph_changed()
         
         def to_undirected(button):
             self.G = nx.Graph()
             self.G.graph['graph'] = {'rankdir':'LR'}
+            self.store = GraphStore()
+            self.autosave.reset(self.G.copy())
+            self.label_autosave.hide()
+            self.recovery_edits = None
             dialog.destroy()
             self.all_clear()
             self.label_di.set_label('Graph')
 
-            self.redraw()
+            self.graph_changed()
 
         dialog = Gtk.Dialog(
             title='Выбор графа',
@@ -794,7 +1883,12 @@ class MainWindow(Gtk.ApplicationWindow):
 
         dialog.show()
 
-    def set_color_to_button(self, button_color, color_hex='#9a9996'):
+    def rgba_from_button(self, button_color):
+        # Цвет кнопки сразу упаковывается, строки в графе не хранятся
+        rgba = button_color.get_rgba()
+        return pack_floats(rgba.red, rgba.green, rgba.blue, rgba.alpha)
+
+    def set_color_to_button(self, button_color, color_hex=NODE_COLOR):
         color = Gdk.RGBA()
         Gdk.RGBA.parse(color, color_hex)
         button_color.set_rgba(color)
@@ -804,11 +1898,22 @@ class App(Adw.Application):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.connect('activate', self.on_activate)
+        # Запуск не уложился в GRAPH_STARTUP_BUDGET
+        self.over_budget = False
+        # Номера папок автосохранения открытых окон
+        self.autosave_slots = set()
 
     def on_activate(self, app):
         self.window = MainWindow(application=app)
         self.window.present()
 
+    def autosave_closed(self, slot):
+        # Поток автосохранения закрытого окна закончил с файлами
+        self.autosave_slots.discard(slot)
+        self.release()
+        return GLib.SOURCE_REMOVE
+
 if __name__ == '__main__':
     app = App(application_id='com.github.me.myproject')
-    app.run(sys.argv)
\ No newline at end of file
+    status = app.run(sys.argv)
+    sys.exit(status or int(app.over_budget))
\ No newline at end of file
@@ -0,0 +1,88 @@
+import networkx as nx
+
+from graph_edit import apply_edit, node_edit, rebase_edit, remove_edit
+from graph_io import read_graph
+from graph_store import GraphStore
+
+LOADED = '''graph {
+    a [weight=3, fillcolor="rgb(1,2,3)", description=first];
+    a -- b [weight=5, fillcolor="#000000"];
+    a -- c [weight=2.5, fillcolor="#000000"];
+}
+'''
+
+
+def test_color_only_edit_has_no_edge_changes(tmp_path):
+    # Из DOT веса приходят строками, из панели - числами
+    path = tmp_path / 'loaded.dot'
+    path.write_text(LOADED, encoding='utf-8')
+    G = read_graph(path)
+    edit = node_edit(
+        G, 'a',
+        {'weight': '3', 'fillcolor': 0x102030ff, 'description': 'first'},
+        {'b': {'weight': 5, 'fillcolor': 0x000000ff}, 'c': {'weight': 2.5, 'fillcolor': 0x000000ff}}
+    )
+    assert edit.edges == {}
+    assert list(edit.nodes) == ['a']
+    assert edit.nodes['a'][1] == {'weight': '3', 'fillcolor': 0x102030ff, 'description': 'first'}
+    assert not edit.weighted()
+
+
+def test_weight_change_is_recorded(tmp_path):
+    path = tmp_path / 'loaded.dot'
+    path.write_text(LOADED, encoding='utf-8')
+    G = read_graph(path)
+    edit = node_edit(G, 'a', {}, {'b': {'weight': 6}, 'c': {'weight': '2.5'}})
+    assert list(edit.edges) == [('a', 'b')]
+    assert edit.edges[('a', 'b')][1]['weight'] == 6
+    assert edit.weighted() == {'a', 'b'}
+
+
+def test_rebase_edit_onto_recovered_graph():
+    # Правки окна, сделанные до восстановления, повторяются поверх
+    # восстановленного графа: результат тот же, что правка дала бы на нём
+    window = nx.Graph()
+    window.add_edge('a', 'b', weight='1')
+    recovered = nx.Graph()
+    recovered.add_edge('b', 'c', weight='2')
+    recovered.add_edge('b', 'x', weight='3')
+
+    added = node_edit(window, 'a', {'weight': 4}, {'b': {'weight': 1}, 'new': {'weight': 7}})
+    apply_edit(window, added)
+    removed = remove_edit(window, 'b')
+    apply_edit(window, removed)
+
+    for edit in (added, removed):
+        edit = rebase_edit(recovered, edit)
+        apply_edit(recovered, edit)
+        # Отмена возвращает восстановленный граф в прежнее состояние
+        undone = recovered.copy()
+        apply_edit(undone, edit.reversed())
+    assert sorted(recovered.nodes) == ['a', 'c', 'new', 'x']
+    assert list(recovered.edges(data=True)) == [('a', 'new', {'weight': 7})]
+    assert sorted(tuple(sorted(edge)) for edge in undone.edges) == [('a', 'new'), ('b', 'c'), ('b', 'x')]
+    assert rebase_edit(recovered, removed) is None
+
+
+def _store_dump(store):
+    nodes = store.node_rows()
+    return (
+        sorted(zip(store.node_name[nodes].tolist(), store.node_weight[nodes].tolist(), store.node_color[nodes].tolist())),
+        sorted((store.key_of(*store.edge_key[row]), store.edge_weight[row], int(store.edge_color[row])) for row in store.edge_rows())
+    )
+
+
+def test_store_apply_edit_matches_rebuild(tmp_path):
+    # Хранилище после правки - то же, что собранное заново из графа
+    path = tmp_path / 'loaded.dot'
+    path.write_text(LOADED, encoding='utf-8')
+    G = read_graph(path)
+    store = GraphStore.from_graph(G)
+    for edit in (
+        node_edit(G, 'a', {'fillcolor': 0x102030ff}, {'c': {'weight': 1}, 'd': {'weight': 4}}),
+        remove_edit(G, 'c'),
+    ):
+        apply_edit(G, edit)
+        store.apply_edit(G, edit)
+
+    assert _store_dump(store) == _store_dump(GraphStore.from_graph(G))
@@ -0,0 +1,123 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from graph_io import MAGIC, _HEADER, _align, read_dot, read_graph, write_graph_bin
+
+# Разбор DOT кусками: результат не должен зависеть от того, где кусок
+# оборвал строку, комментарий, стрелку или список атрибутов
+
+SAMPLE = r'''/* заголовок
+   в две строки */
+strict graph "my graph" {
+    graph [rankdir=LR, label="top"];
+    node [shape=box];
+    // строчный комментарий
+    # и такой
+    a [weight=3, fillcolor="rgb(1,2,3)", description="say \"hi\""];
+    "quoted name" [description="multi \
+line"];
+    b -- c -- d [weight=-.5];
+    e:port:n -- f [weight=2] [fillcolor="#ff0000"];
+    subgraph cluster_x { g; h -- i; }
+    { j -- k }
+    узел -- "a";
+    rank = same;
+    l -- m
+}
+'''
+
+
+def _dump(G):
+    return G.graph, list(G.nodes(data=True)), list(G.edges(data=True))
+
+
+def _pydot_value(value):
+    # pydot оставляет кавычки и экранирование в значениях атрибутов
+    if value.startswith('"'):
+        value = value[1:-1].replace('\\"', '"')
+    return value
+
+
+def _written_by_pydot(path):
+    G = nx.Graph()
+    G.add_node('with space', description='say "hi"', weight='3')
+    G.add_node('кириллица', description='desc "q"')
+    G.add_node('n1', description='back\\slash', fillcolor='rgb(1,2,3)')
+    G.add_node('"quoted"', description='[br], {x; y}')
+    G.add_edge('with space', 'кириллица', weight='2.5', fillcolor='rgba(1,2,3,0.5)')
+    G.add_edge('n1', '-1', weight='-7')
+    G.add_edge('x;y', 'a,b', description='a -- b')
+    nx.nx_pydot.write_dot(G, path)
+
+
+def test_read_dot_chunk_boundaries(tmp_path):
+    path = tmp_path / 'sample.dot'
+    path.write_text(SAMPLE, encoding='utf-8')
+    whole = _dump(read_dot(path, chunk_size=1 << 20))
+    assert whole[1][0] == ('a', {'weight': '3', 'fillcolor': 'rgb(1,2,3)', 'description': 'say "hi"'})
+    assert ('quoted name', {'description': 'multi line'}) in whole[1]
+    assert ('e', 'f', {'weight': '2', 'fillcolor': '#ff0000'}) in whole[2]
+    assert ('h', 'i', {}) in whole[2]
+    for chunk_size in range(1, len(SAMPLE.encode('utf-8')) + 1):
+        assert _dump(read_dot(path, chunk_size=chunk_size)) == whole, chunk_size
+
+
+def test_read_dot_matches_pydot(tmp_path):
+    pytest.importorskip('pydot')
+    path = tmp_path / 'written.dot'
+    _written_by_pydot(path)
+    P = nx.nx_pydot.read_dot(path)
+    nodes = [(node, {key: _pydot_value(value) for key, value in data.items()}) for node, data in P.nodes(data=True)]
+    edges = [(u, v, {key: _pydot_value(value) for key, value in data.items()}) for u, v, data in P.edges(data=True)]
+    for chunk_size in range(1, path.stat().st_size + 1):
+        G = read_dot(path, chunk_size=chunk_size)
+        assert list(G.nodes(data=True)) == nodes, chunk_size
+        assert list(G.edges(data=True)) == edges, chunk_size
+
+
+ROUND_TRIP = r'''graph {
+    "\"quoted\"" [description="desc \"q\"", weight=2];
+    plain [description="\"both\"", fillcolor="#102030"];
+    "with space" [description="back\\slash \"x\" end\""];
+    "with space" -- plain [weight=1.5, fillcolor="rgb(1,2,3)"];
+    "\"quoted\"" -- "with space";
+}
+'''
+
+
+def test_graph_bin_round_trip(tmp_path):
+    # DOT -> .gbin -> граф: кавычки и экранирование в именах и значениях сохраняются
+    dot = tmp_path / 'quoted.dot'
+    dot.write_text(ROUND_TRIP, encoding='utf-8')
+    G = read_graph(dot)
+    assert G.nodes['"quoted"']['description'] == 'desc "q"'
+    assert G.nodes['plain']['description'] == '"both"'
+
+    binary = tmp_path / 'quoted.gbin'
+    write_graph_bin(G, binary)
+    H = read_graph(binary)
+    assert list(H.nodes(data=True)) == list(G.nodes(data=True))
+    assert list(H.edges(data=True)) == list(G.edges(data=True))
+
+
+def test_graph_bin_corrupt(tmp_path):
+    # Повреждённый .gbin - ValueError, который ловят все вызывающие
+    dot = tmp_path / 'quoted.dot'
+    dot.write_text(ROUND_TRIP, encoding='utf-8')
+    binary = tmp_path / 'quoted.gbin'
+    write_graph_bin(read_graph(dot), binary)
+    data = binary.read_bytes()
+
+    broken = tmp_path / 'broken.gbin'
+    for size in (len(MAGIC), _HEADER.size - 1, _HEADER.size + 3, len(data) - 1):
+        broken.write_bytes(data[:size])
+        with pytest.raises(ValueError):
+            read_graph(broken)
+
+    # Номер строки имени первого узла за пределами таблицы строк
+    # (node_name - первый столбец после таблицы строк)
+    offset = _align(_HEADER.size + _HEADER.unpack_from(data)[-1])
+    broken.write_bytes(data[:offset] + np.int32(1000).tobytes() + data[offset + 4:])
+    with pytest.raises(ValueError):
+        read_graph(broken)